@@ -1,467 +1,568 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from datetime import datetime
 import pymongo
-from transformers import pipeline
-import spacy
-from collections import Counter
+from collections import namedtuple
+from contextlib import contextmanager
 import re
+import os
+import threading
+import time
+import logging
+from lexicon_matcher import LexiconMatcher, group_hits
+from chunking import DocumentTooLong, chunk_summary, combine_chunks, split_chunks
+from lexicon_store import ACTION, DEFAULT_ARTIFACT, DEFAULT_SOURCE, EMOTION, HAS_SEVERITY, HIGH_RISK, SYMPTOM, open_artifact
+from inference_batching import MicroBatcher
+from process_engine import ProcessEngine
+from result_cache import ResultCache, cache_key
+from write_behind import WriteBehindWriter
+from sentiment_backends import load_sentiment_pipeline
+from compact_schema import CategoryRegistry, CompactSchema, FullSchema
+from history import HISTORY_PROJECTIONS, InvalidCursor, ensure_history_indexes, fetch_history_page, project_document
+from stats import STATS_BUCKETS, aggregate_stats, record_rollups, rollup_stats
+from profiles import InvalidSubject, escalation_status, profile_id, record_profiles, subject_fields
+from metrics import MetricsRegistry, timed
 
 app = Flask(__name__)
 CORS(app)
 
-# MongoDB connection
-client = pymongo.MongoClient("mongodb://localhost:27017/")
-db = client["mental_health_db"]
-analysis_collection = db["analyses"]
-
-# Load pre-trained models
-sentiment_pipeline = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
-nlp = spacy.load("en_core_web_sm")
-
-# Mental health concern categories with keywords
-concern_categories = {
-   "Anxiety": [
-        "anxiety", "anxious", "nervous", "worry", "worried", "panic", 
-        "fearful", "jittery", "uneasy", "fidgety", "restless", "tense", 
-        "overthinking", "stress", "hypervigilant", "edgy", "apprehensive", 
-        "jumpy", "on edge", "troubled", "dread", "fret", "tremble", 
-        "fidget", "twitch", "distress", "anticipation", "agitated", 
-        "frantic", "overwhelmed", "fear of failure", "self-doubt", 
-        "worried sick", "chest tightness", "mind racing", "panic attack", 
-        "facing fears", "sweating", "short of breath", "feeling small", 
-        "paranoia", "feeling trapped", "constant worrying", "feeling shaky", 
-        "tense muscles", "feeling jumpy", "excessive worry", "fear of change",
-        "avoiding situations", "nervous habits", "physical tension", "social anxiety",
-        "post-traumatic stress", "feeling overwhelmed by uncertainty", "excessive caution"
-    ],
-    "Depression": [
-        "depressed", "low", "sad", "hopeless", "worthless", "down", 
-        "blue", "despair", "melancholy", "emptiness", "disinterest", 
-        "unmotivated", "listless", "gloomy", "miserable", "flat", 
-        "bummed", "disheartened", "weary", "heavy-hearted", "burdened", 
-        "dim", "dark thoughts", "lack of joy", "feeling down", 
-        "emotional pain", "despondent", "feeling empty", "grief", 
-        "sorrow", "loneliness", "feeling isolated", "feeling inadequate", 
-        "self-pity", "feeling heavy", "sadness", "loss of interest", 
-        "tears", "crying", "mental fatigue", "self-loathing", 
-        "worthlessness", "helplessness", "lack of energy", "disappointment",
-        "feeling trapped in sadness", "unfulfilled", "dysthymia", "feeling like a burden",
-        "anhedonia", "chronic sadness", "emptiness", "lost motivation", 
-        "self-hate", "negative self-talk", "overwhelmed by life", "feeling invisible"
-    ],
-    "Stress": [
-        "stress", "stressed", "overwhelmed", "pressure", "tense", 
-        "burnout", "frantic", "strained", "fatigue", "nervous breakdown", 
-        "exhausted", "strained", "juggling too much", "under pressure", 
-        "overloaded", "high tension", "frenzied", "distressed", 
-        "heavy load", "drained", "worn out", "trapped", "tight", 
-        "feeling stretched", "feeling burdened", "demanding", 
-        "chaotic", "too many responsibilities", "mental fatigue", 
-        "physical strain", "feeling pulled in different directions", 
-        "feeling frantic", "mind racing", "lack of balance", 
-        "unable to relax", "overcommitment", "impatient", 
-        "frustration", "time pressure", "feeling overwhelmed by tasks",
-        "excessive demands", "lack of support", "coping mechanisms", 
-        "need for downtime", "high expectations", "performance pressure"
-    ],
-    "Insomnia": [
-        "sleep", "insomnia", "awake", "tired", "restless", "sleepless", 
-        "fatigued", "dozing", "trouble sleeping", "nightmares", "tossing", 
-        "turning", "sleep-deprived", "exhausted", "groggy", "sluggish", 
-        "drowsy", "inability to relax", "staying up", "lost in thought", 
-        "waking up too early", "not enough sleep", "sleeping pills", 
-        "chronic insomnia", "irregular sleep", "sleep issues", 
-        "uncomfortable", "sleep anxiety", "dream disturbances", 
-        "poor sleep quality", "sleep disorders", "excessive wakefulness", 
-        "troubled sleep", "head spinning", "mind racing at night", 
-        "constant fatigue", "daytime drowsiness", "cognitive fog", 
-        "restless legs", "tension headaches", "not feeling rested", 
-        "racing thoughts at night", "emotional exhaustion"
-    ],
-    "Fear": [
-        "fear", "afraid", "scared", "terrified", "panic", "dread", 
-        "apprehensive", "alarm", "phobia", "fearful thoughts", 
-        "anxiety", "timid", "frightened", "shocked", "horrified", 
-        "apprehension", "intimidated", "threatened", "vulnerable", 
-        "worried", "concerned", "troubled", "suspicious", "foreboding", 
-        "paranoia", "fearing the worst", "irrational fears", 
-        "heightened sensitivity", "specific fears", "claustrophobia", 
-        "agoraphobia", "social anxiety", "fear of judgment", 
-        "fear of rejection", "fear of failure", "feeling unsafe", 
-        "anxiety attacks", "survivor's guilt", "feelings of impending doom",
-        "trembling", "heart racing", "panic attacks", "sense of danger"
-    ],
-    "Frustration": [
-        "frustrated", "irritated", "annoyed", "agitated", "exasperated", 
-        "vexed", "discontented", "stuck", "fed up", "tired of", 
-        "put out", "displeased", "exhausted", "unsettled", "disappointed", 
-        "perturbed", "riled up", "bothered", "disheartened", "disgruntled", 
-        "feeling trapped", "not getting anywhere", "hitting a wall", 
-        "exhaustion", "cognitive overload", "feelings of helplessness", 
-        "fighting against the current", "annoying tasks", 
-        "feeling blocked", "lack of control", "challenging situations",
-        "futile efforts", "feeling powerless", "irritation", 
-        "persistent annoyances", "bottled up emotions", 
-        "feeling cornered", "futile attempts"
-    ],
-    "Loneliness": [
-        "lonely", "isolated", "alone", "friendless", "detached", 
-        "forlorn", "desolate", "abandoned", "left out", "missing connection", 
-        "disconnected", "withdrawn", "socially awkward", "feeling blue", 
-        "lack of companionship", "longing for company", "yearning for friendship", 
-        "nobody understands", "feeling invisible", "unseen", 
-        "isolation", "feeling unheard", "solitary", 
-        "need for connection", "heartache", "emptiness", 
-        "nobody cares", "lost in a crowd", "feeling empty inside", 
-        "unfulfilled relationships", "social fatigue"
-    ],
-    "Hopefulness": [
-        "hopeful", "optimistic", "positive", "expectant", "encouraged", 
-        "aspirational", "faithful", "looking forward", "bright future", 
-        "light at the end of the tunnel", "motivated", "inspired", 
-        "believing", "dreaming", "looking up", "full of life", 
-        "good vibes", "feeling uplifted", "seeing possibilities", 
-        "open to change", "faith in tomorrow", "anticipating joy", 
-        "finding strength", "embracing new beginnings", 
-        "looking for solutions", "persistence", "faith in self"
-    ],
-    "Happiness": [
-        "happy", "joyful", "cheerful", "content", "delighted", "elated", 
-        "gleeful", "feeling good", "smiling", "positive vibes", 
-        "ecstatic", "blissful", "radiant", "thrilled", "grinning", 
-        "chipper", "upbeat", "satisfied", "carefree", "optimistic", 
-        "light-hearted", "thriving", "joyous", "bubbly", "full of joy", 
-        "celebrating life", "pure happiness", "feeling blessed", 
-        "good times", "laughter", "warmth", "playful", "grateful", 
-        "living in the moment", "embracing happiness", 
-        "making memories", "finding joy in little things"
-    ],
-    "Grief": [
-        "grief", "mourning", "loss", "heartbroken", "sadness", 
-        "suffering", "pain", "longing", "yearning", "remorse", 
-        "bitterness", "despair", "disappointment", "regret", 
-        "feeling empty", "unresolved feelings", "grieving", 
-        "emotional pain", "tears", "heartache", "troubled", 
-        "loss of connection", "nostalgia", "remembrance", 
-        "finding closure", "difficult memories", 
-        "finding solace", "searching for peace", "feeling incomplete", 
-        "life after loss", "learning to cope", "processing emotions"
-    ],
-    "Confusion": [
-        "confused", "uncertain", "perplexed", "bewildered", "mixed signals", 
-        "lost", "disoriented", "puzzled", "unsettled", "muddled", 
-        "unsure", "discombobulated", "caught off guard", 
-        "unclear", "mind fog", "trapped in indecision", "cluttered mind", 
-        "feeling stuck", "questioning everything", 
-        "thinking in circles", "mental chaos", "grappling with thoughts",
-        "overloaded with information", "lack of clarity", 
-        "conflicting feelings", "feeling torn", "struggling to decide"
-    ],
-    
-    # Psychopathic feelings and mental conditions
-    "Narcissism": [
-        "narcissistic", "self-centered", "grandiose", "entitled", 
-        "self-important", "superior", "overly proud", 
-        "self-absorbed", "thinking too highly of self", "self-serving", 
-        "need for admiration", "lack of regard for others", "self-promotion", 
-        "attention-seeking", "comparing to others", "excessive pride",
-        "ego-driven", "delusions of grandeur", "need for control", 
-        "grandiosity", "hyper-competitiveness", "sensitive to criticism",
-        "manipulative tendencies", "using others for gain", 
-        "superficial charm", "lack of empathy", "resentment towards others' success"
-    ],
-    "Lack of Empathy": [
-        "lack of empathy", "unemotional", "cold-hearted", 
-        "indifferent", "apathetic", "uncaring", 
-        "unable to connect with others", "emotionally detached", 
-        "disregard for feelings", "insensitive", "disconnected", 
-        "not understanding", "emotionally shallow", "self-involved",
-        "self-serving bias", "failure to understand consequences", 
-        "emotional blindness", "limited emotional insight", 
-        "unresponsive", "lack of compassion", "dismissive of others' feelings",
-        "unwillingness to compromise", "self-absorbed behaviors"
-    ],
-    "Impulsivity": [
-        "impulsive", "rash", "reckless", "spontaneous", 
-        "hasty", "quick decisions", "flying off the handle", 
-        "lack of foresight", "acting without thinking", "compulsive behavior",
-        "urgency", "difficulty waiting", "inability to delay gratification", 
-        "instant gratification", "excessive risk-taking", 
-        "difficulty controlling impulses", "emotion-driven actions", 
-        "blurt out", "erratic behavior", "lack of planning", 
-        "need for immediate reward", "feeling out of control"
-    ],
-    "Manipulation": [
-        "manipulative", "deceptive", "calculating", 
-        "scheming", "coercive", "conniving", 
-        "using others", "controlling", "playing mind games", 
-        "exploiting vulnerabilities", "twisting the truth",
-        "gaslighting", "emotional blackmail", "emotional manipulation", 
-        "victim playing", "using guilt", "feigned ignorance", 
-        "covert aggression", "misleading", "strategic deceit",
-        "deliberate misunderstandings", "emotional exploitation"
-    ],
-    "Antisocial Behavior": [
-        "antisocial", "disregard for others", "lawless", 
-        "violent", "disruptive", "socially unacceptable", 
-        "rebellious", "hostile to society", "nonconformist", 
-        "criminal behavior", "lack of remorse", "manipulative tendencies",
-        "troublesome behavior", "rejection of authority", 
-        "violating social norms", "aggressive", "threatening", 
-        "substance abuse", "disrespectful", "irresponsible", 
-        "alienation from society", "social dysfunction"
-    ],
-    "Psychopathy": [
-        "psychopathic", "sociopathic", "emotionally detached", 
-        "remorseless", "unfeeling", "lack of conscience", 
-        "manipulative tendencies", "no guilt", "thrill-seeking behavior", 
-        "lack of long-term goals", "pervasive lying", "callousness", 
-        "self-destructive behaviors", "difficulties in relationships", 
-        "inability to form genuine connections", "superficial charm", 
-        "shallow emotions", "irresponsibility", "exploitation of others",
-        "need for stimulation", "failure to learn from experience"
-    ],
-    
-    # Self-harm, suicidal thoughts, and self-obsession
-    "Self-Harm": [
-        "self-harm", "cutting", "burning", "self-injury", 
-        "hurt myself", "self-destructive", "pain as relief", 
-        "in need of release", "inflicting pain", "self-punishment", 
-        "finding comfort in pain", "destructive behavior", "seeking pain",
-        "risk-taking behavior", "cry for help", "feeling numb", 
-        "emotional release", "hurt to feel alive", "self-sabotage",
-        "dealing with emotional pain", "finding a way to cope",
-        "misguided coping mechanisms", "overwhelmed by emotions"
-    ],
-    "Suicidal Thoughts": [
-        "suicidal", "end it all", "wish I were dead", 
-        "take my life", "kill myself", "suicide", 
-        "hopelessness", "despair", "feeling trapped", 
-        "wanting to escape", "life isn't worth living", "dark thoughts", 
-        "feeling like a burden", "no way out", "thoughts of self-harm", 
-        "wanting to disappear", "facing the end", "seeing no future",
-        "reaching out for help", "struggling with despair", "no more pain",
-        "unbearable suffering", "mental anguish", "wanting peace",
-        "seeking relief", "drowning in sadness", "last resort", 
-        "overwhelmed by thoughts of death"
-    ],
-    "Self-Obsession": [
-        "self-obsessed", "self-absorbed", "selfish", 
-        "self-centered", "narcissistic", "self-focused", 
-        "constantly thinking about self", "looking inwards", 
-        "self-promotion", "self-admiration", "self-aggrandizing", 
-        "overly introspective", "self-fixation", "overthinking oneself", 
-        "excessive self-analysis", "feeling superior", 
-        "entitlement", "looking for validation", 
-        "using others for self-gain", "need for constant reassurance"
-    ],
-    "Hopelessness": [
-        "hopeless", "despairing", "lost hope", 
-        "no way out", "pessimism", "feeling trapped", 
-        "powerlessness", "inability to change", "loss of faith", 
-        "giving up", "overwhelming darkness", "stagnation", 
-        "stuck in a rut", "feeling lifeless", "endless struggle", 
-        "feeling paralyzed", "constant disappointment", 
-        "lack of progress", "resigned to fate", "burdened by reality"
-    ],
-    "Desperation": [
-        "desperate", "panicked", "at the end of my rope", 
-        "futile", "lost", "stuck", "feeling helpless", 
-        "no options left", "wishing for a way out", 
-        "overwhelmed by circumstances", "pleading", 
-        "seeking a miracle", "hitting rock bottom", 
-        "feeling defeated", "yearning for change", 
-        "losing all hope", "on the verge of collapse"
-    ],
-    "Homicidal Ideation": [
-        "homicidal", "kill", "murderous", "harm others", 
-        "violent thoughts", "wanting to hurt", "thoughts of violence", 
-        "desiring to end life", "intrusive thoughts about killing", 
-        "fantasizing about death", "feelings of rage", 
-        "demanding justice", "wanting revenge", "need for control",
-        "aggressive impulses", "impulsive rage", "justified violence", 
-        "destructive urges", "uncontrollable anger", "escape through harm"
-    ],
-
-    # Mixed feelings, emotional complexity, and dumb thoughts
-    "Mixed Feelings": [
-        "conflicted", "ambivalent", "torn", "both sides", 
-        "bittersweet", "overwhelming emotions", "complex feelings", 
-        "confusion about feelings", "mixed signals", "unclear", 
-        "feeling both ways", "emotionally complex", "overwhelmed by options", 
-        "struggling to decide", "feeling caught", "inconsistent emotions", 
-        "complicated emotions", "not sure how to feel", "dilemma", 
-        "difficult choices", "weighing options"
-    ],
-    "Dumb Thoughts": [
-        "crazy ideas", "silly thoughts", "absurd notions", 
-        "ridiculous thoughts", "thoughts that make no sense", 
-        "random musings", "bizarre ideas", "foolish thoughts", 
-        "light-hearted musings", "strange perceptions", "dizzying ideas", 
-        "uncommon thoughts", "unfounded worries", "irrational beliefs", 
-        "spontaneous thoughts", "mind wandering", "lack of focus", 
-        "idle thinking", "seeking distractions", "lost in thought"
-    ],
-
-    # Everyday values in simple English
-    "Values": [
-        "love", "kindness", "respect", "honesty", "trust", 
-        "friendship", "loyalty", "patience", "gratitude", 
-        "understanding", "compassion", "generosity", "forgiveness", 
-        "fairness", "integrity", "courage", "responsibility", 
-        "hard work", "humility", "perseverance", "community", 
-        "unity", "empathy", "positivity", "self-respect", 
-        "creativity", "self-improvement", "growth", "caring", 
-        "supportiveness", "inclusiveness", "tolerance", 
-        "joyfulness", "happiness", "serenity", "mindfulness", 
-        "flexibility", "acceptance", "resourcefulness", 
-        "dedication", "open-mindedness", "authenticity", 
-        "simplicity", "well-being", "collaboration", 
-        "peacefulness", "humor", "passion", "playfulness", 
-        "adventure", "self-awareness", "reliability", "sincerity", 
-        "boundaries", "balance", "self-care", "wholeness", 
-        "self-acceptance", "adaptability", "learning", "exploration", 
-        "sustainability", "harmony", "authentic relationships", 
-        "social responsibility", "safety", "support", "family", 
-        "tradition", "fun", "discovery", "self-discipline", 
-        "dedication", "authenticity", "personal growth", 
-        "well-roundedness", "vision", "inspiration", 
-        "meaningfulness", "balance", "positive reinforcement"
-    ],
-    # Expanded mental health concern categories with additional keywords
-# concern_categories = {
-    # Love and Attraction
-    "Love": [
-        "love", "affection", "romance", "passion", "adore", 
-        "infatuation", "devotion", "attachment", "longing", 
-        "heartfelt", "desire", "caring", "intimacy", 
-        "relationship", "fondness", "sweetheart", "heartwarming", 
-        "crush", "cherish", "emotion", "enamored", 
-        "yearning", "being in love", "deep connection", 
-        "spark", "chemistry", "affectionate", "dating", 
-        "soulmate", "companion", "unconditional love"
-    ],
-    "Attraction": [
-        "attraction", "drawn to", "chemistry", "fascination", 
-        "allure", "magnetism", "enthralling", "captivated", 
-        "mesmerized", "charisma", "irresistible", "appealing", 
-        "infatuated", "magnetic pull", "intense interest", 
-        "curiosity", "spark of interest", "admiration", 
-        "crush", "romantic feelings", "compelling connection"
-    ],
-    
-    # Dilemmas and Confusion
-    "Dilemma": [
-        "dilemma", "difficult choice", "hard decision", "tough call", 
-        "conflicting priorities", "weighing options", "uncertainty", 
-        "struggling to choose", "crossroads", "lost in choices", 
-        "making sacrifices", "finding balance", "conflicted", 
-        "ambiguity", "ethical dilemma", "heart vs. mind", 
-        "wishy-washy", "feeling torn", "mixed feelings", 
-        "overthinking decisions", "needing clarity", "split between options"
-    ],
-    "Confused Decisions": [
-        "confused", "uncertain", "puzzled", "bewildered", 
-        "unsure", "lost", "disoriented", "feeling stuck", 
-        "questioning choices", "lack of clarity", "second-guessing", 
-        "paralyzed by options", "decision fatigue", "mind clutter", 
-        "indecisive", "trapped in thought", "grappling with choices", 
-        "weighing pros and cons", "lost in thought", "doubtful"
-    ],
-
-    # Feelings related to Kill and Violence
-    "Homicidal Thoughts": [
-        "kill", "murder", "homicidal", "violence", 
-        "violent thoughts", "harm others", "thoughts of rage", 
-        "anger towards others", "desiring harm", "dark thoughts", 
-        "intrusive thoughts about killing", "fantasizing about death", 
-        "violent impulses", "aggressive thoughts", "outbursts", 
-        "destructive tendencies", "retaliation", "revenge fantasies", 
-        "loss of control", "wanting to lash out", "thoughts of destruction"
-    ],
-    
-    # Mixed feelings and Emotional Complexity
-    "Mixed Feelings": [
-        "conflicted", "ambivalent", "torn", "bittersweet", 
-        "overwhelming emotions", "confusion about feelings", 
-        "unclear emotions", "feeling both ways", "emotional conflict", 
-        "emotional complexity", "dueling feelings", "cognitive dissonance", 
-        "overwhelmed by emotions", "struggling with feelings", 
-        "complex feelings", "emotionally complicated", 
-        "contradictory feelings", "sense of duality", 
-        "inner turmoil", "difficult choices"
-    ],
-}
+# Prometheus-style metrics, rendered as text by /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("analysis_stage_seconds", "Time spent in each analysis stage", ["stage"])
+request_seconds = metrics.histogram("http_request_seconds", "Request latency by endpoint", ["endpoint"])
+requests_total = metrics.counter("http_requests_total", "Requests by endpoint and status code", ["endpoint", "status"])
+request_errors_total = metrics.counter("http_request_errors_total", "Requests that ended in a 5xx", ["endpoint"])
 
-# Intensity modifiers
-intensity_modifiers = {
-    'extreme': 3, 'very': 2, 'really': 2, 'severely': 3, 'completely': 2,
-    'totally': 2, 'always': 2, 'never': 2, 'constantly': 2, 'extremely': 3
-}
+# Requests carrying this header get a per-stage "timings" block (ms)
+DEBUG_TIMINGS_HEADER = "X-Debug-Timings"
+
+# Startup mode: "eager" loads the models at import (use with a pre-fork
+# master so workers share them copy-on-write), "lazy" defers loading to the
+# first request or an explicit warm_up(), "background" loads them in a
+# thread so the process answers liveness checks immediately
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "eager")
+
+# MongoDB connection, opened lazily once per process since MongoClient must
+# not be shared across fork
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+_mongo_lock = threading.Lock()
+_mongo_client = None
+_mongo_pid = None
+
+def get_db():
+    global _mongo_client, _mongo_pid
+    if _mongo_pid != os.getpid():
+        with _mongo_lock:
+            if _mongo_pid != os.getpid():
+                _mongo_client = pymongo.MongoClient(MONGO_URI)
+                _mongo_pid = os.getpid()
+    return _mongo_client["mental_health_db"]
+
+def install_mongo_client(client):
+    # Swap in another client (e.g. mongomock) for benchmarks and offline runs
+    global _mongo_client, _mongo_pid
+    with _mongo_lock:
+        _mongo_client = client
+        _mongo_pid = os.getpid()
+
+def get_analysis_collection():
+    return get_db()["analyses"]
+
+def ensure_indexes():
+    # Idempotent; run in the background at startup so a slow or missing
+    # MongoDB never blocks boot
+    try:
+        ensure_history_indexes(get_analysis_collection(), storage_schema)
+    except pymongo.errors.PyMongoError:
+        logging.getLogger(__name__).exception("Could not create MongoDB indexes")
+
+def get_rollup_collection():
+    return get_db()["analysis_rollups"]
+
+# Hourly rollups maintained on every write so /stats need not rescan analyses
+STATS_ROLLUPS = os.environ.get("STATS_ROLLUPS", "1") == "1"
+
+def update_rollups(docs):
+    if STATS_ROLLUPS:
+        record_rollups(get_rollup_collection(), docs)
+
+def get_profile_collection():
+    return get_db()["risk_profiles"]
+
+# Rolling per-user/per-session profiles for analyses that carry a user_id or
+# session_id: EWMA intensity (weight PROFILE_EWMA_ALPHA on the newest score)
+# and the last PROFILE_RISK_WINDOW risk levels
+USER_PROFILES = os.environ.get("USER_PROFILES", "1") == "1"
+PROFILE_EWMA_ALPHA = float(os.environ.get("PROFILE_EWMA_ALPHA", "0.3"))
+PROFILE_RISK_WINDOW = int(os.environ.get("PROFILE_RISK_WINDOW", "10"))
+# A profile is escalating with this many HIGH levels in the window, or an
+# EWMA intensity at or above ESCALATION_EWMA
+ESCALATION_HIGH_COUNT = int(os.environ.get("ESCALATION_HIGH_COUNT", "3"))
+ESCALATION_EWMA = float(os.environ.get("ESCALATION_EWMA", "7.5"))
+
+def update_profiles(docs):
+    if USER_PROFILES:
+        record_profiles(get_profile_collection(), docs, PROFILE_EWMA_ALPHA, PROFILE_RISK_WINDOW)
 
-# Severity words
-severity_words = {
-    'suicidal': 10, 'kill': 9, 'die': 8, 'harm': 8, 'hurt': 7, 'hopeless': 7,
-    'desperate': 7, 'severe': 6, 'terrible': 6, 'horrible': 6, 'anxious': 5,
-    'depressed': 6, 'scared': 5, 'afraid': 5, 'worried': 4, 'sad': 4,
-    'upset': 4, 'stress': 4, 'tired': 3, 'uncomfortable': 3, 'uneasy': 3
+def after_analyses_written(docs):
+    # Everything derived from stored analyses, updated on the same write
+    # path. The analyses are already stored, so a failure here is logged
+    # rather than failing the request (or the bulk run) that wrote them.
+    for update in (update_rollups, update_profiles):
+        try:
+            update(docs)
+        except Exception:
+            logging.getLogger(__name__).exception("Could not apply %s to %d analyses", update.__name__, len(docs))
+
+def get_concern_id_collection():
+    return get_db()["concern_ids"]
+
+# How analyses are laid out in MongoDB: "full" stores the response shape,
+# "compact" short field names, small-int codes for polarity, risk level and
+# concerns, and input_text as COMPACT_TEXT ("plain", "hash" keeps only its
+# sha256, "zlib"). Reads expand either one to the response shape. Documents
+# already stored are not rewritten when this changes.
+ANALYSIS_SCHEMA = os.environ.get("ANALYSIS_SCHEMA", "full")
+COMPACT_TEXT = os.environ.get("COMPACT_TEXT", "plain")
+if ANALYSIS_SCHEMA == "compact":
+    storage_schema = CompactSchema(CategoryRegistry(get_concern_id_collection), COMPACT_TEXT)
+else:
+    storage_schema = FullSchema()
+
+# Default response detail for the analyze endpoints, overridden per request
+# with "detail": "full" or "summary" (the /history summary fields)
+RESPONSE_DETAIL = os.environ.get("RESPONSE_DETAIL", "full")
+
+class InvalidDetail(ValueError):
+    pass
+
+def requested_detail(data):
+    detail = request.args.get('detail') or data.get('detail') or RESPONSE_DETAIL
+    if detail not in HISTORY_PROJECTIONS:
+        raise InvalidDetail(f"'detail' must be one of {sorted(HISTORY_PROJECTIONS)}")
+    return detail
+
+def shape_result(result, detail):
+    return project_document(result, HISTORY_PROJECTIONS[detail])
+
+MONGO_CREATE_INDEXES = os.environ.get("MONGO_CREATE_INDEXES", "1") == "1"
+HISTORY_DEFAULT_LIMIT = int(os.environ.get("HISTORY_DEFAULT_LIMIT", "20"))
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", "100"))
+
+# How analyses reach MongoDB: "async" (write-behind buffer), "sync" (on the
+# request thread) or "disabled"
+ANALYSIS_WRITE_MODE = os.environ.get("ANALYSIS_WRITE_MODE", "async")
+if ANALYSIS_WRITE_MODE == "async":
+    analysis_writer = WriteBehindWriter(
+        get_analysis_collection,
+        max_batch=int(os.environ.get("WRITE_BEHIND_MAX_BATCH", "500")),
+        flush_interval_ms=float(os.environ.get("WRITE_BEHIND_FLUSH_MS", "200")),
+        max_pending=int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000")),
+        enqueue_timeout=float(os.environ.get("WRITE_BEHIND_ENQUEUE_TIMEOUT", "1.0")),
+        after_write=after_analyses_written,
+        transform=storage_schema.encode
+    )
+else:
+    analysis_writer = None
+
+# Pre-trained models; heavy imports happen inside the loaders
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+# "pytorch" (full precision), "quantized" (dynamic int8) or "onnx" (ONNX Runtime CPU)
+SENTIMENT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "pytorch")
+SENTIMENT_ONNX_PATH = os.environ.get("SENTIMENT_ONNX_PATH")
+SPACY_MODEL = "en_core_web_sm"
+
+# spaCy components to leave out per profile. extract_keywords only needs
+# doc.ents and token text, and the ner component in en_core_web_sm carries its
+# own tok2vec, so "ner" drops everything else; "tokenizer" drops NER too and
+# parses with nlp.make_doc
+SPACY_PROFILES = {
+    "full": [],
+    "ner": ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"],
+    "tokenizer": ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "ner"],
 }
+SPACY_PROFILE = os.environ.get("SPACY_PROFILE", "ner")
+if SPACY_PROFILE not in SPACY_PROFILES:
+    raise ValueError(f"Unknown SPACY_PROFILE {SPACY_PROFILE!r}, expected one of {sorted(SPACY_PROFILES)}")
+SPACY_ENTITIES = SPACY_PROFILE != "tokenizer"
+_models_lock = threading.Lock()
+_sentiment_pipeline = None
+_nlp = None
+model_load_seconds = {}
+
+def get_sentiment_pipeline():
+    global _sentiment_pipeline
+    if _sentiment_pipeline is None:
+        with _models_lock:
+            if _sentiment_pipeline is None:
+                started = time.perf_counter()
+                _sentiment_pipeline = load_sentiment_pipeline(
+                    SENTIMENT_MODEL, SENTIMENT_BACKEND, onnx_path=SENTIMENT_ONNX_PATH
+                )
+                model_load_seconds["sentiment"] = time.perf_counter() - started
+    return _sentiment_pipeline
+
+def get_nlp():
+    global _nlp
+    if _nlp is None:
+        with _models_lock:
+            if _nlp is None:
+                started = time.perf_counter()
+                import spacy
+                _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_PROFILES[SPACY_PROFILE])
+                model_load_seconds["spacy"] = time.perf_counter() - started
+    return _nlp
+
+def models_ready():
+    return _sentiment_pipeline is not None and _nlp is not None
+
+def install_models(sentiment_pipeline=None, nlp=None):
+    # Use preloaded or stand-in models instead of loading the configured ones
+    global _sentiment_pipeline, _nlp
+    with _models_lock:
+        if sentiment_pipeline is not None:
+            _sentiment_pipeline = sentiment_pipeline
+        if nlp is not None:
+            _nlp = nlp
+
+def warm_up():
+    # Load everything up front; call from a pre-fork master or a warm-up hook
+    get_sentiment_pipeline()
+    get_nlp()
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+def start_background_warm_up():
+    # At most one loader thread per process; a failed load is retried by the
+    # next call
+    global _warm_up_thread
+    with _warm_up_lock:
+        if models_ready() or (_warm_up_thread is not None and _warm_up_thread.is_alive()):
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="model-warm-up", daemon=True)
+        _warm_up_thread.start()
+
+# Batch analysis tunables
+ANALYZE_BATCH_SIZE = int(os.environ.get("ANALYZE_BATCH_SIZE", "32"))
+NLP_PIPE_BATCH_SIZE = int(os.environ.get("NLP_PIPE_BATCH_SIZE", "64"))
+NLP_PIPE_PROCESSES = int(os.environ.get("NLP_PIPE_PROCESSES", "1"))
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", "1000"))
+
+# Texts longer than CHUNK_THRESHOLD_CHARS are split into sentence-packed
+# chunks of at most CHUNK_MAX_WORDS words (inside the sentiment model's
+# 512-token window) and analyzed in batches; documents needing more than
+# CHUNK_MAX_CHUNKS chunks are rejected so latency stays bounded
+CHUNKING = os.environ.get("CHUNKING", "1") == "1"
+CHUNK_THRESHOLD_CHARS = int(os.environ.get("CHUNK_THRESHOLD_CHARS", "2000"))
+CHUNK_MAX_WORDS = int(os.environ.get("CHUNK_MAX_WORDS", "300"))
+CHUNK_MAX_CHUNKS = int(os.environ.get("CHUNK_MAX_CHUNKS", "200"))
+# The sentiment model's window less [CLS]/[SEP]; shorter texts over this many
+# tokens (punctuation-dense ones, say) are chunked too
+SENTIMENT_MAX_TOKENS = int(os.environ.get("SENTIMENT_MAX_TOKENS", "510"))
+
+# Per-request analysis deadline in seconds (0 disables). gunicorn's timeout
+# only replaces workers that stop heartbeating and never cuts a slow gthread
+# request short, so /analyze and /analyze_batch check this between chunk
+# batches and give up with a 504 instead of holding a thread indefinitely
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "30"))
+_deadline = threading.local()
+
+class DeadlineExceeded(Exception):
+    pass
+
+@contextmanager
+def analysis_deadline(deadline):
+    # deadline is a time.monotonic() value, which is system-wide, so it can
+    # be handed to the analysis worker processes as-is
+    previous = getattr(_deadline, "value", None)
+    _deadline.value = deadline
+    try:
+        yield
+    finally:
+        _deadline.value = previous
+
+def request_deadline():
+    return time.monotonic() + REQUEST_TIMEOUT_SECONDS if REQUEST_TIMEOUT_SECONDS > 0 else None
+
+def current_deadline():
+    return getattr(_deadline, "value", None)
+
+def check_deadline():
+    deadline = current_deadline()
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineExceeded("Analysis did not finish before the request deadline")
+
+# Micro-batching of concurrent /analyze requests in front of the models
+INFERENCE_BATCHING = os.environ.get("INFERENCE_BATCHING", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "16"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "5"))
+
+def _sentiment_batch(texts):
+    return get_sentiment_pipeline()(texts, batch_size=len(texts), truncation=True)
+
+def _nlp_batch(texts):
+    return list(get_nlp().pipe(texts, batch_size=len(texts)))
+
+if INFERENCE_BATCHING:
+    sentiment_batcher = MicroBatcher(_sentiment_batch, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, name="sentiment-batcher")
+    # Tokenizing alone is too cheap to be worth queueing for
+    nlp_batcher = MicroBatcher(_nlp_batch, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, name="nlp-batcher") if SPACY_ENTITIES else None
+else:
+    sentiment_batcher = None
+    nlp_batcher = None
+
+# ANALYSIS_PROCESSES > 0 runs the models in that many worker processes,
+# forked after the models are loaded, each pinned to a core with
+# ANALYSIS_PROCESS_THREADS intra-op threads. Cache lookups and writes stay
+# in this process. Under gunicorn each worker's pool is pinned to its own
+# slice of the cores (see pre_fork in gunicorn.conf.py), so size it as
+# WEB_CONCURRENCY x ANALYSIS_PROCESSES <= cores.
+ANALYSIS_PROCESSES = int(os.environ.get("ANALYSIS_PROCESSES", "0"))
+ANALYSIS_PROCESS_THREADS = int(os.environ.get("ANALYSIS_PROCESS_THREADS", "1"))
+ANALYSIS_PIN_CORES = os.environ.get("ANALYSIS_PIN_CORES", "1") == "1"
+
+def _on_analysis_worker_start():
+    # Workers run one task at a time, so micro-batching would only add wait
+    global sentiment_batcher, nlp_batcher
+    sentiment_batcher = None
+    nlp_batcher = None
+
+if ANALYSIS_PROCESSES > 0:
+    analysis_engine = ProcessEngine(
+        ANALYSIS_PROCESSES, ANALYSIS_PROCESS_THREADS, ANALYSIS_PIN_CORES, on_worker_start=_on_analysis_worker_start
+    )
+else:
+    analysis_engine = None
+
+# Lexicons (concern categories, severity and modifier weights, keyword
+# patterns) are edited in lexicons.json and compiled into a memory-mapped
+# artifact by lexicon_store.py. LEXICON_PATH points at a prebuilt artifact;
+# when LEXICON_SOURCE is newer the artifact is rebuilt on load.
+LEXICON_PATH = os.environ.get("LEXICON_PATH", DEFAULT_ARTIFACT)
+LEXICON_SOURCE = os.environ.get("LEXICON_SOURCE", DEFAULT_SOURCE)
+# Seconds between checks for a changed artifact or source; a change is
+# loaded and swapped in without a restart. 0 disables reloading.
+LEXICON_RELOAD_SECONDS = float(os.environ.get("LEXICON_RELOAD_SECONDS", "30"))
+
+# Compile every lexicon into one automaton; set LEXICON_WORD_BOUNDARY=1 so
+# that e.g. "kill" no longer matches "skill"
+LEXICON_WORD_BOUNDARY = os.environ.get("LEXICON_WORD_BOUNDARY", "0") == "1"
+
+def build_lexicon_matcher(lexicons):
+    matcher = LexiconMatcher(word_boundary=LEXICON_WORD_BOUNDARY)
+    for category, keywords in lexicons["concern_categories"].items():
+        matcher.add("concerns", category, keywords)
+    matcher.add_weighted("severity", lexicons["severity_words"])
+    matcher.add_weighted("modifiers", lexicons["intensity_modifiers"])
+    matcher.add("high_risk", "high_risk", lexicons["high_risk_words"])
+    # Multi-word symptoms never equal a single token, so they are found by
+    # the same scan instead
+    matcher.add("symptom_phrases", "symptom_phrases", [p for p in lexicons["symptom_patterns"] if ' ' in p])
+    return matcher.compile()
+
+def compute_lexicon_version(artifact):
+    # The artifact's content hash, plus the matching mode that changes results
+    return artifact.version + ("+wb" if LEXICON_WORD_BOUNDARY else "")
+
+class LexiconSet:
+    # One loaded lexicon version and the matcher built from it. Analyses hold
+    # on to the set they started with, so a reload never mixes versions.
+    def __init__(self, artifact):
+        self.artifact = artifact
+        lexicons = artifact.to_lexicons()
+        self.concern_categories = lexicons["concern_categories"]
+        self.severity_words = lexicons["severity_words"]
+        self.intensity_modifiers = lexicons["intensity_modifiers"]
+        self.high_risk_words = lexicons["high_risk_words"]
+        self.emotion_patterns = lexicons["emotion_patterns"]
+        self.symptom_patterns = lexicons["symptom_patterns"]
+        self.action_patterns = lexicons["action_patterns"]
+        # Token -> role flags (emotion, symptom, action, severity, high risk)
+        # precomputed in the artifact, for the single-pass token scorer
+        self.token_roles = {}
+        for phrase_id, phrase in enumerate(artifact.phrases):
+            flags = artifact.weights(phrase_id)[2]
+            if flags:
+                self.token_roles[phrase] = flags
+        self.symptom_phrase_order = {pattern: i for i, pattern in enumerate(self.symptom_patterns)}
+        self.matcher = build_lexicon_matcher(lexicons)
+        self.version = compute_lexicon_version(artifact)
+        self.analysis_version = f"{self.version}:{SENTIMENT_MODEL}:{SENTIMENT_BACKEND}:{SPACY_MODEL}:{SPACY_PROFILE}"
+
+_lexicons_lock = threading.Lock()
+_lexicons_checked = time.monotonic()
+
+def load_lexicons():
+    # Module-level names mirror the current set for scripts that read them
+    global lexicons, lexicon_matcher, concern_categories, severity_words, intensity_modifiers
+    global high_risk_words, emotion_patterns, symptom_patterns, action_patterns
+    global LEXICON_VERSION, ANALYSIS_VERSION
+    loaded = LexiconSet(open_artifact(LEXICON_PATH, LEXICON_SOURCE))
+    lexicons = loaded
+    lexicon_matcher = loaded.matcher
+    concern_categories = loaded.concern_categories
+    severity_words = loaded.severity_words
+    intensity_modifiers = loaded.intensity_modifiers
+    high_risk_words = loaded.high_risk_words
+    emotion_patterns = loaded.emotion_patterns
+    symptom_patterns = loaded.symptom_patterns
+    action_patterns = loaded.action_patterns
+    LEXICON_VERSION = loaded.version
+    ANALYSIS_VERSION = loaded.analysis_version
+    return loaded
+
+def lexicons_changed():
+    try:
+        stat = os.stat(LEXICON_PATH)
+    except OSError:
+        return False
+    if (stat.st_mtime_ns, stat.st_size) != lexicons.artifact.signature:
+        return True
+    return bool(LEXICON_SOURCE) and os.path.exists(LEXICON_SOURCE) and os.stat(LEXICON_SOURCE).st_mtime_ns > stat.st_mtime_ns
+
+def current_lexicons():
+    # At most one stat() per LEXICON_RELOAD_SECONDS; a broken update is
+    # logged and the loaded version stays in use
+    global _lexicons_checked
+    if LEXICON_RELOAD_SECONDS > 0 and time.monotonic() - _lexicons_checked >= LEXICON_RELOAD_SECONDS:
+        with _lexicons_lock:
+            if time.monotonic() - _lexicons_checked >= LEXICON_RELOAD_SECONDS:
+                _lexicons_checked = time.monotonic()
+                if lexicons_changed():
+                    try:
+                        load_lexicons()
+                    except (OSError, ValueError):
+                        logging.getLogger(__name__).exception("Could not reload lexicons from %s", LEXICON_PATH)
+    return lexicons
+
+load_lexicons()
+
+# Result cache keyed by text + ANALYSIS_VERSION; RESULT_CACHE_SIZE=0
+# disables the in-memory tier, RESULT_CACHE_PERSISTENT=1 adds a Mongo tier
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PERSISTENT = os.environ.get("RESULT_CACHE_PERSISTENT", "0") == "1"
+
+if RESULT_CACHE:
+    result_cache = ResultCache(
+        max_entries=RESULT_CACHE_SIZE,
+        ttl_seconds=RESULT_CACHE_TTL,
+        get_collection=(lambda: get_db()["analysis_cache"]) if RESULT_CACHE_PERSISTENT else None
+    )
+else:
+    result_cache = None
+
+# Per-request fields are never cached
+_uncached_fields = ("input_text", "timestamp", "_id")
+
+def lookup_cached_analysis(text, lexicons):
+    if result_cache is None:
+        return None, None
+    key = cache_key(text, lexicons.analysis_version)
+    cached = result_cache.get(key)
+    if cached is None:
+        return key, None
+    return key, {"input_text": text, **cached, "timestamp": datetime.utcnow()}
+
+def store_cached_analysis(key, result):
+    if result_cache is not None and key is not None:
+        result_cache.put(key, {k: v for k, v in result.items() if k not in _uncached_fields})
+
+def parse_text(text):
+    if not SPACY_ENTITIES:
+        return get_nlp().make_doc(text)
+    if nlp_batcher is not None:
+        return nlp_batcher(text)
+    return get_nlp()(text)
+
+def classify_sentiment(text):
+    if sentiment_batcher is not None:
+        return sentiment_batcher(text)
+    return get_sentiment_pipeline()(text, truncation=True)[0]
+
+class AnalysisContext:
+    # Per-request state shared by every scorer: the text is parsed by spaCy
+    # and classified by the sentiment model exactly once.
+    def __init__(self, text, doc=None, sentiment=None, timings=None, lexicons=None):
+        self.text = text
+        self.lexicons = lexicons if lexicons is not None else current_lexicons()
+        self.text_lower = text.lower()
+        self.timings = timings
+        if doc is None:
+            with timed(stage_seconds, timings, stage="spacy_parse"):
+                doc = parse_text(text)
+        self.doc = doc
+        self.tokens = [token.text.lower() for token in self.doc]
+        if sentiment is None:
+            with timed(stage_seconds, timings, stage="sentiment"):
+                sentiment = classify_sentiment(text)
+        self.sentiment = sentiment
+        with timed(stage_seconds, timings, stage="lexicon_match"):
+            self.lexicon_hits = self.lexicons.matcher.find(self.text_lower)
+            self.lexicon_labels = group_hits(self.lexicon_hits)
+        with timed(stage_seconds, timings, stage="token_scan"):
+            self.token_scores = score_tokens(self)
+
+TokenScores = namedtuple("TokenScores", ["emotions", "symptoms", "actions", "repetition_bonus"])
+
+def score_tokens(context):
+    # One pass over the tokens with dict lookups: keyword hits and repeated
+    # severity words together, so the cost follows the text, not the lexicons
+    roles = context.lexicons.token_roles
+    emotions, symptoms, actions = [], [], []
+    severity_counts = {}
+    for token, token_text in zip(context.doc, context.tokens):
+        flags = roles.get(token_text)
+        if not flags:
+            continue
+        if flags & EMOTION:
+            emotions.append(token.text)
+        if flags & SYMPTOM:
+            symptoms.append(token.text)
+        if flags & ACTION:
+            actions.append(token.text)
+        if flags & HAS_SEVERITY:
+            severity_counts[token_text] = severity_counts.get(token_text, 0) + 1
 
-def detect_polarity(text):
-    result = sentiment_pipeline(text)[0]
-    return result['label']
+    # Multi-word symptoms come from the lexicon scan, once each, in lexicon order
+    phrases = {hit.phrase for hit in context.lexicon_hits if hit.lexicon == "symptom_phrases"}
+    symptoms.extend(sorted(phrases, key=context.lexicons.symptom_phrase_order.get))
 
-def extract_keywords(text):
-    doc = nlp(text)
+    repetition_bonus = sum(0.5 for count in severity_counts.values() if count > 1)
+    return TokenScores(emotions, symptoms, actions, repetition_bonus)
+
+def detect_polarity(context):
+    return context.sentiment['label']
+
+def extract_keywords(context):
+    doc = context.doc
     keywords = {'entities': [], 'emotions': [], 'symptoms': [], 'actions': []}
     
     # Extract named entities
     for ent in doc.ents:
         keywords['entities'].append(ent.text)
     
-    # Pattern matching lists
-    emotion_patterns = ['feel', 'feeling', 'felt', 'anxiety', 'depression', 'stress', 'happy', 'sad', 'angry']
-    symptom_patterns = ['cant sleep', "can't sleep", 'tired', 'exhausted', 'pain', 'ache', 'worried']
-    action_patterns = ['kill', 'hurt', 'harm', 'help', 'need', 'want']
-    text_lower = text.lower()
-    
-    # Process each token
-    for token in doc:
-        token_text = token.text.lower()
-        if token_text in emotion_patterns:
-            keywords['emotions'].append(token.text)
-        if token_text in symptom_patterns:
-            keywords['symptoms'].append(token.text)
-        if token_text in action_patterns:
-            keywords['actions'].append(token.text)
-    
-    # Check for multi-word patterns
-    for pattern in symptom_patterns:
-        if ' ' in pattern and pattern in text_lower:
-            keywords['symptoms'].append(pattern)
+    # Token and multi-word hits from the shared token scan
+    scores = context.token_scores
+    keywords['emotions'].extend(scores.emotions)
+    keywords['symptoms'].extend(scores.symptoms)
+    keywords['actions'].extend(scores.actions)
     
     return keywords
 
-def calculate_intensity(text, keywords):
+def calculate_intensity(context, keywords):
     base_score = 1
-    text_lower = text.lower()
-    doc = nlp(text_lower)
     
     # Check for severity words
-    max_severity = 0
-    for word, score in severity_words.items():
-        if word in text_lower:
-            max_severity = max(max_severity, score)
+    max_severity = max(context.lexicon_labels.get("severity", {}).values(), default=0)
     
     if max_severity > 0:
         base_score = max_severity
     
     # Apply intensity modifiers
-    modifier_bonus = 0
-    for modifier, value in intensity_modifiers.items():
-        if modifier in text_lower:
-            modifier_bonus += value
+    modifier_bonus = sum(context.lexicon_labels.get("modifiers", {}).values())
     
     # Consider number of symptoms and concerns
     symptom_count = len(keywords['symptoms'])
@@ -470,12 +571,11 @@ def calculate_intensity(text, keywords):
     concern_bonus = min(2, (symptom_count + emotion_count + action_count) / 3)
     
     # Consider sentiment
-    sentiment = detect_polarity(text)
+    sentiment = detect_polarity(context)
     sentiment_modifier = 1.2 if sentiment == "NEGATIVE" else 0.8
     
     # Check for repetition
-    word_counts = Counter([token.text.lower() for token in doc if token.text.lower() in severity_words])
-    repetition_bonus = sum(0.5 for count in word_counts.values() if count > 1)
+    repetition_bonus = context.token_scores.repetition_bonus
     
     # Calculate final score
     final_score = (base_score + modifier_bonus + concern_bonus + repetition_bonus) * sentiment_modifier
@@ -490,31 +590,27 @@ def calculate_intensity(text, keywords):
         "final_score": round(final_score, 1)
     }
 
-def classify_concern(text):
-    concerns = []
-    text_lower = text.lower()
-    
-    for category, keywords in concern_categories.items():
-        if any(keyword in text_lower for keyword in keywords):
-            concerns.append(category)
+def classify_concern(context):
+    # OR the category bitsets of every matched phrase; bit order is lexicon order
+    matched = {hit.phrase for hit in context.lexicon_hits if hit.lexicon == "concerns"}
+    concerns = context.lexicons.artifact.categories_for(matched)
     
     if not concerns:
         concerns.append("General Mental Health")
     
     return concerns
 
-def assess_risk(text, keywords):
+def assess_risk(context, keywords):
     risk_level = "LOW"
     risk_factors = []
     
-    high_risk_words = ['kill', 'death', 'suicide', 'hurt', 'harm']
-    
-    if any(word in text.lower() for word in high_risk_words):
+    if "high_risk" in context.lexicon_labels:
         risk_level = "HIGH"
         risk_factors.append("High-risk words detected")
     
     if keywords['actions']:
-        if any(action.lower() in high_risk_words for action in keywords['actions']):
+        roles = context.lexicons.token_roles
+        if any(roles.get(action.lower(), 0) & HIGH_RISK for action in keywords['actions']):
             risk_level = "HIGH"
             risk_factors.append("Concerning actions detected")
     
@@ -523,12 +619,152 @@ def assess_risk(text, keywords):
         "factors": risk_factors
     }
 
-def analyze_mental_health(text):
-    keywords = extract_keywords(text)
-    intensity = calculate_intensity(text, keywords)
-    polarity = detect_polarity(text)
-    concerns = classify_concern(text)
-    risk_assessment = assess_risk(text, keywords)
+def build_contexts(texts, lexicons=None):
+    # Vectorized counterpart of AnalysisContext: padded mini-batches through
+    # the transformer and nlp.pipe through spaCy
+    with timed(stage_seconds, stage="batch_sentiment"):
+        sentiments = get_sentiment_pipeline()(texts, batch_size=ANALYZE_BATCH_SIZE, truncation=True)
+    with timed(stage_seconds, stage="batch_spacy_parse"):
+        if SPACY_ENTITIES:
+            docs = list(get_nlp().pipe(texts, batch_size=NLP_PIPE_BATCH_SIZE, n_process=NLP_PIPE_PROCESSES))
+        else:
+            docs = [get_nlp().make_doc(text) for text in texts]
+    return [
+        AnalysisContext(text, doc=doc, sentiment=sentiment, lexicons=lexicons)
+        for text, doc, sentiment in zip(texts, docs, sentiments)
+    ]
+
+def count_tokens(text):
+    tokenizer = getattr(get_sentiment_pipeline(), "tokenizer", None)
+    if tokenizer is None:
+        return 0
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+def is_long_document(text):
+    if not CHUNKING:
+        return False
+    if len(text) > CHUNK_THRESHOLD_CHARS:
+        return True
+    # Every token covers at least one character, so only texts longer than
+    # the window need tokenizing
+    return len(text) > SENTIMENT_MAX_TOKENS and count_tokens(text) > SENTIMENT_MAX_TOKENS
+
+def iter_chunk_analyses(text, lexicons):
+    # Yields (start, end, result, sentiment) per chunk, one model batch at a time
+    spans = split_chunks(text, CHUNK_MAX_WORDS)
+    if len(spans) > CHUNK_MAX_CHUNKS:
+        raise DocumentTooLong(f"Text splits into {len(spans)} chunks; at most {CHUNK_MAX_CHUNKS} are analyzed")
+    for i in range(0, len(spans), ANALYZE_BATCH_SIZE):
+        check_deadline()
+        batch = spans[i:i + ANALYZE_BATCH_SIZE]
+        contexts = build_contexts([text[start:end] for start, end in batch], lexicons)
+        for (start, end), context in zip(batch, contexts):
+            yield start, end, analyze_context(context), context.sentiment
+
+def combine_chunk_analyses(text, chunks, lexicons):
+    result = combine_chunks(chunks, lexicons.artifact.categories)
+    return {
+        "input_text": text,
+        **result,
+        "lexicon_version": lexicons.version,
+        "timestamp": datetime.utcnow()
+    }
+
+def analyze_long_document(text, lexicons, timings=None):
+    with timed(stage_seconds, timings, stage="chunked_analysis"):
+        return combine_chunk_analyses(text, list(iter_chunk_analyses(text, lexicons)), lexicons)
+
+def compute_analysis(text, lexicons, timings=None):
+    if is_long_document(text):
+        return analyze_long_document(text, lexicons, timings)
+    # Parse and classify once; every scorer reads from the shared context
+    return analyze_context(AnalysisContext(text, timings=timings, lexicons=lexicons))
+
+def compute_analysis_batch(texts, lexicons):
+    # Long documents are chunked; the rest share batched model calls
+    results = [None] * len(texts)
+    short = []
+    for i, text in enumerate(texts):
+        if is_long_document(text):
+            results[i] = analyze_long_document(text, lexicons)
+        else:
+            short.append(i)
+    # In slices, so the deadline is checked between model batches
+    for start in range(0, len(short), ANALYZE_BATCH_SIZE):
+        check_deadline()
+        indices = short[start:start + ANALYZE_BATCH_SIZE]
+        for i, context in zip(indices, build_contexts([texts[i] for i in indices], lexicons)):
+            results[i] = analyze_context(context)
+    return results
+
+def _analyze_in_worker(text, deadline=None):
+    timings = {}
+    with analysis_deadline(deadline):
+        result = compute_analysis(text, current_lexicons(), timings)
+    return result, timings
+
+def _analyze_batch_in_worker(texts, deadline=None):
+    with analysis_deadline(deadline):
+        return compute_analysis_batch(texts, current_lexicons())
+
+def analyze_mental_health(text, timings=None):
+    lexicons = current_lexicons()
+    with timed(stage_seconds, timings, stage="cache_lookup"):
+        key, result = lookup_cached_analysis(text, lexicons)
+    if result is not None:
+        return result
+
+    if analysis_engine is not None:
+        result, worker_timings = analysis_engine.run(_analyze_in_worker, text, current_deadline())
+        # Stage histograms are scraped from this process, so replay the
+        # worker's stage timings here
+        for stage, seconds in worker_timings.items():
+            stage_seconds.observe(seconds, stage=stage)
+        if timings is not None:
+            timings.update(worker_timings)
+    else:
+        result = compute_analysis(text, lexicons, timings)
+    store_cached_analysis(key, result)
+    return result
+
+def analyze_mental_health_batch(texts):
+    if not texts:
+        return []
+
+    lexicons = current_lexicons()
+    results = []
+    keys = []
+    for text in texts:
+        key, result = lookup_cached_analysis(text, lexicons)
+        keys.append(key)
+        results.append(result)
+
+    # Only cache misses go through the models, sharded across the worker
+    # processes when the engine is on
+    missing = [i for i, result in enumerate(results) if result is None]
+    missing_texts = [texts[i] for i in missing]
+    if analysis_engine is not None:
+        computed = analysis_engine.map_shards(_analyze_batch_in_worker, missing_texts, current_deadline())
+    else:
+        computed = compute_analysis_batch(missing_texts, lexicons)
+    for i, result in zip(missing, computed):
+        results[i] = result
+        store_cached_analysis(keys[i], result)
+    return results
+
+def analyze_context(context):
+    text = context.text
+    timings = context.timings
+    with timed(stage_seconds, timings, stage="extract_keywords"):
+        keywords = extract_keywords(context)
+    with timed(stage_seconds, timings, stage="calculate_intensity"):
+        intensity = calculate_intensity(context, keywords)
+    with timed(stage_seconds, timings, stage="detect_polarity"):
+        polarity = detect_polarity(context)
+    with timed(stage_seconds, timings, stage="classify_concern"):
+        concerns = classify_concern(context)
+    with timed(stage_seconds, timings, stage="assess_risk"):
+        risk_assessment = assess_risk(context, keywords)
 
     return {
         "input_text": text,
@@ -537,35 +773,329 @@ def analyze_mental_health(text):
         "identified_concerns": concerns,
         "intensity_analysis": intensity,
         "risk_assessment": risk_assessment,
+        "lexicon_version": context.lexicons.version,
         "timestamp": datetime.utcnow()
     }
 
+def persist_analyses(results, timings=None):
+    # Insert copies so the generated ObjectIds stay out of the JSON response
+    docs = [dict(result) for result in results]
+    if not docs or ANALYSIS_WRITE_MODE == "disabled":
+        return
+    with timed(stage_seconds, timings, stage="persist"):
+        if analysis_writer is not None:
+            # Fall back to a direct write when the buffer stays full (backpressure)
+            docs = [doc for doc in docs if not analysis_writer.submit(doc)]
+            if not docs:
+                return
+        get_analysis_collection().insert_many([storage_schema.encode(doc) for doc in docs], ordered=False)
+        after_analyses_written(docs)
+
+def format_timings(timings):
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     try:
         data = request.json
         text = data.get('text', '')
+        # Optional user_id / session_id, which also feed the rolling risk profile
+        subject = subject_fields(data)
+        detail = requested_detail(data)
+
+        timings = {} if request.headers.get(DEBUG_TIMINGS_HEADER) else None
 
         # Perform comprehensive analysis
-        analysis_result = analyze_mental_health(text)
+        with analysis_deadline(request_deadline()):
+            analysis_result = analyze_mental_health(text, timings)
+        analysis_result.update(subject)
         
-        # Insert into MongoDB
-        analysis_collection.insert_one(analysis_result)
+        # Persist to MongoDB (write-behind unless ANALYSIS_WRITE_MODE=sync)
+        persist_analyses([analysis_result], timings)
+
+        analysis_result = shape_result(analysis_result, detail)
+        if timings is not None:
+            analysis_result["timings"] = format_timings(timings)
 
         # Return the analysis result as JSON
         return jsonify(analysis_result)
     
+    except (InvalidSubject, InvalidDetail) as e:
+        return jsonify({"error": str(e)}), 400
+    except DocumentTooLong as e:
+        return jsonify({"error": str(e)}), 413
+    except DeadlineExceeded as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    try:
+        data = request.json
+        texts = data.get('texts', [])
+
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({"error": "'texts' must be a list of strings"}), 400
+        if len(texts) > MAX_BATCH_ITEMS:
+            return jsonify({"error": f"At most {MAX_BATCH_ITEMS} texts per batch"}), 400
+
+        subject = subject_fields(data)
+        detail = requested_detail(data)
+
+        with analysis_deadline(request_deadline()):
+            results = analyze_mental_health_batch(texts)
+        for result in results:
+            result.update(subject)
+
+        persist_analyses(results)
+
+        return jsonify({"results": [shape_result(result, detail) for result in results]})
+
+    except (InvalidSubject, InvalidDetail) as e:
+        return jsonify({"error": str(e)}), 400
+    except DocumentTooLong as e:
+        return jsonify({"error": str(e)}), 413
+    except DeadlineExceeded as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+@app.route('/analyze_stream', methods=['POST'])
+def analyze_stream():
+    # Server-sent events: one "chunk" event per analyzed chunk as soon as its
+    # batch finishes, then the combined document as a "result" event
+    data = request.json or {}
+    text = data.get('text', '')
+    try:
+        subject = subject_fields(data)
+        detail = requested_detail(data)
+    except (InvalidSubject, InvalidDetail) as e:
+        return jsonify({"error": str(e)}), 400
+    lexicons = current_lexicons()
+
+    def events():
+        try:
+            key, result = lookup_cached_analysis(text, lexicons)
+            if result is None and is_long_document(text):
+                chunks = []
+                for chunk in iter_chunk_analyses(text, lexicons):
+                    chunks.append(chunk)
+                    yield format_event("chunk", chunk_summary(*chunk))
+                result = combine_chunk_analyses(text, chunks, lexicons)
+                store_cached_analysis(key, result)
+            elif result is None:
+                # Short texts are one chunk with the regular result shape
+                context = AnalysisContext(text, lexicons=lexicons)
+                result = analyze_context(context)
+                yield format_event("chunk", chunk_summary(0, len(text), result, context.sentiment))
+                store_cached_analysis(key, result)
+            result = dict(result, **subject)
+            persist_analyses([result])
+            yield format_event("result", shape_result(result, detail))
+        except Exception as e:
+            yield format_event("error", {"error": str(e)})
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.before_request
+def start_request_timer():
+    request.environ["metrics.started"] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = request.environ.get("metrics.started")
+    endpoint = request.endpoint or "unmatched"
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=str(response.status_code))
+    if response.status_code >= 500:
+        request_errors_total.inc(endpoint=endpoint)
+    return response
+
+@metrics.register_collector
+def collect_component_metrics():
+    yield ("model_load_seconds", "gauge", "Time taken to load each model",
+           [({"model": model}, seconds) for model, seconds in model_load_seconds.items()])
+    yield ("models_ready", "gauge", "1 once every model is loaded", [({}, models_ready())])
+    if result_cache is not None:
+        cache = result_cache.stats()
+        yield ("result_cache_lookups_total", "counter", "Result cache lookups by outcome", [
+            ({"outcome": "memory_hit"}, cache["memory_hits"]),
+            ({"outcome": "persistent_hit"}, cache["persistent_hits"]),
+            ({"outcome": "miss"}, cache["misses"]),
+        ])
+        yield ("result_cache_evictions_total", "counter", "LRU evictions from the in-memory tier", [({}, cache["evictions"])])
+        yield ("result_cache_entries", "gauge", "Entries in the in-memory tier", [({}, cache["size"])])
+    batchers = [("sentiment", sentiment_batcher), ("nlp", nlp_batcher)]
+    batchers = [(name, batcher.stats()) for name, batcher in batchers if batcher is not None]
+    if batchers:
+        yield ("inference_queue_depth", "gauge", "Requests waiting for a micro-batch",
+               [({"model": name}, stats["queue_depth"]) for name, stats in batchers])
+        yield ("inference_batches_total", "counter", "Batched forward passes run",
+               [({"model": name}, stats["batches"]) for name, stats in batchers])
+        yield ("inference_batch_items_total", "counter", "Items run through batched forward passes",
+               [({"model": name}, stats["items"]) for name, stats in batchers])
+    if analysis_writer is not None:
+        writer = analysis_writer.stats()
+        yield ("write_behind_pending", "gauge", "Analyses buffered for MongoDB", [({}, writer["pending"])])
+        yield ("write_behind_documents_total", "counter", "Buffered analyses by outcome", [
+            ({"outcome": "written"}, writer["written"]),
+            ({"outcome": "failed"}, writer["failed"]),
+            ({"outcome": "rejected"}, writer["rejected"]),
+            ({"outcome": "dropped"}, writer["dropped"]),
+        ])
+    if analysis_engine is not None:
+        engine = analysis_engine.stats()
+        yield ("process_engine_workers", "gauge", "Analysis worker processes", [({}, engine["workers"])])
+        yield ("process_engine_items_total", "counter", "Texts sent to analysis worker processes", [({}, engine["items"])])
+        yield ("process_engine_errors_total", "counter", "Failed analysis worker tasks", [({}, engine["errors"])])
+        yield ("process_engine_restarts_total", "counter", "Analysis pools replaced after a worker died", [({}, engine["restarts"])])
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/inference_stats', methods=['GET'])
+def inference_stats():
+    return jsonify({
+        "enabled": INFERENCE_BATCHING,
+        "sentiment": sentiment_batcher.stats() if sentiment_batcher else None,
+        "nlp": nlp_batcher.stats() if nlp_batcher else None,
+        "process_engine": analysis_engine.stats() if analysis_engine else None
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "enabled": RESULT_CACHE,
+        "version": current_lexicons().analysis_version,
+        "stats": result_cache.stats() if result_cache else None
+    })
+
+@app.route('/write_stats', methods=['GET'])
+def write_stats():
+    return jsonify({
+        "mode": ANALYSIS_WRITE_MODE,
+        "schema": storage_schema.name,
+        "stats": analysis_writer.stats() if analysis_writer else None
+    })
+
+@app.route('/history', methods=['GET'])
+def history():
+    try:
+        limit = min(max(1, int(request.args.get('limit', HISTORY_DEFAULT_LIMIT))), HISTORY_MAX_LIMIT)
+        view = request.args.get('view', 'summary')
+        if view not in HISTORY_PROJECTIONS:
+            return jsonify({"error": f"'view' must be one of {sorted(HISTORY_PROJECTIONS)}"}), 400
+
+        items, next_cursor = fetch_history_page(
+            get_analysis_collection(),
+            limit,
+            cursor=request.args.get('cursor'),
+            risk_level=request.args.get('risk_level'),
+            concerns=request.args.getlist('concern'),
+            view=view,
+            schema=storage_schema
+        )
+        return jsonify({"items": items, "next_cursor": next_cursor})
+
+    except (ValueError, InvalidCursor) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    try:
+        source = request.args.get('source', 'rollup')
+        bucket = request.args.get('bucket', 'day')
+        if source not in ('rollup', 'raw'):
+            return jsonify({"error": "'source' must be 'rollup' or 'raw'"}), 400
+        if bucket not in STATS_BUCKETS:
+            return jsonify({"error": f"'bucket' must be one of {sorted(STATS_BUCKETS)}"}), 400
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+
+        # Rollups are hourly, so their since/until resolve to whole hours
+        if source == 'rollup':
+            result = rollup_stats(get_rollup_collection(), bucket, since, until)
+        else:
+            result = aggregate_stats(get_analysis_collection(), bucket, since, until, storage_schema)
+        return jsonify({"source": source, "bucket": bucket, **result})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/profile', methods=['GET'])
+def profile():
+    # Rolling risk profile and escalation status for ?user_id= or ?session_id=
+    try:
+        subject = subject_fields(request.args)
+        if not subject:
+            return jsonify({"error": "Pass 'user_id' or 'session_id'"}), 400
+        doc = get_profile_collection().find_one({"_id": profile_id(subject)})
+        if doc is None:
+            return jsonify({"error": "No analyses recorded for this subject"}), 404
+        return jsonify({
+            "profile": doc["_id"],
+            **escalation_status(doc, ESCALATION_HIGH_COUNT, ESCALATION_EWMA)
+        })
+
+    except InvalidSubject as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving, models or not
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: only route traffic here once the models are in memory. In
+    # lazy mode the first probe starts loading them, since a readiness-gated
+    # load balancer never sends the request that would
+    ready = models_ready()
+    if not ready and STARTUP_MODE == "lazy":
+        start_background_warm_up()
+    return jsonify({
+        "status": "ready" if ready else "loading",
+        "startup_mode": STARTUP_MODE,
+        "spacy_profile": SPACY_PROFILE,
+        "sentiment_backend": SENTIMENT_BACKEND,
+        "lexicon_version": current_lexicons().version,
+        "model_load_seconds": model_load_seconds
+    }), 200 if ready else 503
+
 @app.route('/test_connection', methods=['GET'])
 def test_connection():
     try:
         # Try a simple query
-        test_data = analysis_collection.find_one()
+        test_data = get_analysis_collection().find_one()
         return jsonify(test_data if test_data else {"message": "No data found"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+if STARTUP_MODE == "eager":
+    warm_up()
+elif STARTUP_MODE == "background":
+    start_background_warm_up()
+
+if MONGO_CREATE_INDEXES:
+    threading.Thread(target=ensure_indexes, name="mongo-indexes", daemon=True).start()
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; production runs through serve.py / gunicorn.conf.py.
+    # The debug reloader re-imports this module (and reloads the models) on
+    # every change, so it is opt-in
+    app.run(debug=os.environ.get("FLASK_DEBUG", "0") == "1")
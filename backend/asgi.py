@@ -0,0 +1,291 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from urllib.parse import parse_qs
+
+import app as analysis_app
+from async_inference import InferenceLane, QueueTimeout, Saturated
+from chunking import DocumentTooLong
+from profiles import InvalidSubject, profile_updates, subject_fields
+from stats import rollup_updates
+
+# asyncio serving path: POST /analyze runs on the event loop and hands the
+# CPU-bound analysis to a bounded executor, so one slow request no longer
+# holds a whole worker. Every other route is the Flask app, bridged through
+# asgiref when it is installed (pip install "flask[async]").
+#
+#   uvicorn asgi:application --workers 4
+#   GUNICORN_APP=asgi:application GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker python serve.py
+
+logger = logging.getLogger(__name__)
+
+# "thread" shares the models and micro-batcher with the rest of the process;
+# "process" forks workers after the models are loaded
+ASYNC_EXECUTOR = os.environ.get("ASYNC_EXECUTOR", "thread")
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", os.cpu_count() or 1))
+# Admission control: requests past this many queued or running per lane get
+# a 429; requests not started within ASYNC_QUEUE_TIMEOUT_MS get a 503
+ASYNC_MAX_PENDING = int(os.environ.get("ASYNC_MAX_PENDING", "64"))
+ASYNC_QUEUE_TIMEOUT_MS = float(os.environ.get("ASYNC_QUEUE_TIMEOUT_MS", "2000"))
+# Texts at least this long run in their own, smaller lane so a burst of long
+# documents cannot queue ahead of short messages
+ASYNC_LONG_TEXT_CHARS = int(os.environ.get("ASYNC_LONG_TEXT_CHARS", "2000"))
+ASYNC_LONG_WORKERS = int(os.environ.get("ASYNC_LONG_WORKERS", max(1, ASYNC_WORKERS // 4)))
+ASYNC_LONG_MAX_PENDING = int(os.environ.get("ASYNC_LONG_MAX_PENDING", "16"))
+# Background MongoDB writes in flight (ANALYSIS_WRITE_MODE=async). Past this,
+# new analyses are turned away with a 503 instead of queueing writes without
+# bound behind a slow database
+ASYNC_MAX_PENDING_WRITES = int(os.environ.get("ASYNC_MAX_PENDING_WRITES", "1000"))
+# Seconds shutdown waits, in all, for background writes and the write-behind
+# buffer before the process exits
+ASYNC_SHUTDOWN_TIMEOUT = float(os.environ.get("ASYNC_SHUTDOWN_TIMEOUT", "10"))
+ASYNC_MAX_BODY_BYTES = int(os.environ.get("ASYNC_MAX_BODY_BYTES", str(1024 * 1024)))
+RETRY_AFTER_SECONDS = os.environ.get("ASYNC_RETRY_AFTER", "1")
+
+lanes = {
+    "short": InferenceLane("short", ASYNC_WORKERS, ASYNC_MAX_PENDING, ASYNC_QUEUE_TIMEOUT_MS, ASYNC_EXECUTOR),
+    "long": InferenceLane("long", ASYNC_LONG_WORKERS, ASYNC_LONG_MAX_PENDING, ASYNC_QUEUE_TIMEOUT_MS, ASYNC_EXECUTOR),
+}
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    flask_application = WsgiToAsgi(analysis_app.app)
+except ImportError:
+    flask_application = None
+
+# Async MongoDB client (pymongo >= 4.13), opened lazily per event loop
+_async_client = None
+_async_loop = None
+# In-flight background writes, awaited on shutdown
+_write_tasks = set()
+_write_counters = {"shed": 0, "written": 0, "failed": 0}
+
+
+def get_async_db():
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_loop is not loop:
+        from pymongo import AsyncMongoClient
+        _async_client = AsyncMongoClient(analysis_app.MONGO_URI)
+        _async_loop = loop
+    return _async_client["mental_health_db"]
+
+
+async def persist_analysis(doc):
+    # Returns True once the analysis and everything derived from it is stored
+    try:
+        db = get_async_db()
+        # New concern categories get their compact id from a (sync) registry
+        # write; known ones are served from its in-process cache
+        await db["analyses"].insert_one(analysis_app.storage_schema.encode(doc))
+        if analysis_app.STATS_ROLLUPS:
+            await db["analysis_rollups"].bulk_write(rollup_updates([doc]), ordered=False)
+        updates = profile_updates([doc], analysis_app.PROFILE_EWMA_ALPHA, analysis_app.PROFILE_RISK_WINDOW)
+        if analysis_app.USER_PROFILES and updates:
+            await db["risk_profiles"].bulk_write(updates, ordered=True)
+    except Exception:
+        logger.exception("Could not store analysis")
+        _write_counters["failed"] += 1
+        return False
+    _write_counters["written"] += 1
+    return True
+
+
+def _analyze(text, want_timings, deadline):
+    # Runs in the executor; timings travel back with the result so this also
+    # works from a worker process. The deadline is a time.monotonic() value
+    # taken when the request arrived, so time spent queued counts against it
+    timings = {} if want_timings else None
+    with analysis_app.analysis_deadline(deadline):
+        result = analysis_app.analyze_mental_health(text, timings)
+    return result, timings
+
+
+def _headers(content_type, extra=()):
+    return [
+        (b"content-type", content_type),
+        (b"access-control-allow-origin", b"*"),
+        *extra,
+    ]
+
+
+async def send_json(send, status, body, extra_headers=()):
+    payload = analysis_app.app.json.dumps(body).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": _headers(b"application/json", extra_headers)})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > ASYNC_MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def analyze(scope, receive, send):
+    try:
+        body = await read_body(receive)
+    except ValueError as e:
+        return 413, {"error": str(e)}
+    if body is None:
+        return None, None
+    try:
+        data = json.loads(body or b"null")
+        text = data.get('text', '')
+    except (ValueError, AttributeError):
+        return 400, {"error": "Expected a JSON object with a 'text' field"}
+    try:
+        subject = subject_fields(data)
+    except InvalidSubject as e:
+        return 400, {"error": str(e)}
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    detail = query.get("detail", [None])[0] or data.get("detail") or analysis_app.RESPONSE_DETAIL
+    if detail not in analysis_app.HISTORY_PROJECTIONS:
+        return 400, {"error": f"'detail' must be one of {sorted(analysis_app.HISTORY_PROJECTIONS)}"}
+
+    if analysis_app.STARTUP_MODE != "lazy" and not analysis_app.models_ready():
+        return 503, {"error": "Models are still loading"}
+    if analysis_app.ANALYSIS_WRITE_MODE == "async" and len(_write_tasks) >= ASYNC_MAX_PENDING_WRITES:
+        # Shed before spending CPU on an analysis that could not be stored
+        _write_counters["shed"] += 1
+        return 503, {"error": "Analysis storage is backed up, retry shortly"}
+
+    headers = dict(scope.get("headers", ()))
+    want_timings = analysis_app.DEBUG_TIMINGS_HEADER.lower().encode("latin-1") in headers
+    lane = lanes["long"] if len(text) >= ASYNC_LONG_TEXT_CHARS else lanes["short"]
+    try:
+        result, timings = await lane.run(_analyze, text, want_timings, analysis_app.request_deadline())
+    except Saturated:
+        return 429, {"error": "Too many analyses in progress, retry shortly"}
+    except QueueTimeout:
+        return 503, {"error": "Analysis queue is saturated, retry shortly"}
+    except DocumentTooLong as e:
+        return 413, {"error": str(e)}
+    except analysis_app.DeadlineExceeded as e:
+        return 504, {"error": str(e)}
+    result.update(subject)
+
+    if analysis_app.ANALYSIS_WRITE_MODE != "disabled":
+        # Insert a copy so the generated ObjectId stays out of the JSON response
+        write = persist_analysis(dict(result))
+        if analysis_app.ANALYSIS_WRITE_MODE == "sync":
+            started = time.perf_counter()
+            await write
+            if timings is not None:
+                timings["persist"] = time.perf_counter() - started
+        else:
+            task = asyncio.ensure_future(write)
+            _write_tasks.add(task)
+            task.add_done_callback(_write_tasks.discard)
+
+    result = analysis_app.shape_result(result, detail)
+    if timings is not None:
+        result["timings"] = analysis_app.format_timings(timings)
+    return 200, result
+
+
+async def handle_analyze(scope, receive, send):
+    if scope["method"] == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": _headers(b"text/plain", (
+            (b"access-control-allow-methods", b"POST, OPTIONS"),
+            (b"access-control-allow-headers", b"content-type, " + analysis_app.DEBUG_TIMINGS_HEADER.encode("latin-1")),
+        ))})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    if scope["method"] != "POST":
+        await send_json(send, 405, {"error": "Method not allowed"}, ((b"allow", b"POST, OPTIONS"),))
+        return
+
+    started = time.perf_counter()
+    try:
+        status, body = await analyze(scope, receive, send)
+    except Exception as e:
+        logger.exception("Analysis failed")
+        status, body = 500, {"error": str(e)}
+    if status is None:
+        # Client went away before sending the body
+        return
+
+    extra_headers = ((b"retry-after", RETRY_AFTER_SECONDS.encode("latin-1")),) if status in (429, 503) else ()
+    await send_json(send, status, body, extra_headers)
+    analysis_app.request_seconds.observe(time.perf_counter() - started, endpoint="analyze")
+    analysis_app.requests_total.inc(endpoint="analyze", status=str(status))
+    if status >= 500:
+        analysis_app.request_errors_total.inc(endpoint="analyze")
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Let buffered writes land before the process exits, for at most
+            # ASYNC_SHUTDOWN_TIMEOUT so a dead MongoDB cannot hold it up
+            deadline = time.monotonic() + ASYNC_SHUTDOWN_TIMEOUT
+            if _write_tasks:
+                _, unfinished = await asyncio.wait(list(_write_tasks), timeout=ASYNC_SHUTDOWN_TIMEOUT)
+                if unfinished:
+                    logger.warning("Shutting down with %d analysis writes unfinished", len(unfinished))
+                    for task in unfinished:
+                        task.cancel()
+            for lane in lanes.values():
+                lane.shutdown(wait=False)
+            if _async_client is not None:
+                await _async_client.close()
+            if analysis_app.analysis_writer is not None:
+                # close() blocks, so keep it off the event loop
+                close = functools.partial(analysis_app.analysis_writer.close,
+                                          timeout=max(0.0, deadline - time.monotonic()))
+                await asyncio.get_running_loop().run_in_executor(None, close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] == "http" and scope["path"] == "/analyze":
+        await handle_analyze(scope, receive, send)
+        return
+    if scope["type"] == "http" and scope["path"] == "/async_stats":
+        await send_json(send, 200, {**{name: lane.stats() for name, lane in lanes.items()}, "writes": write_stats()})
+        return
+    if flask_application is not None:
+        await flask_application(scope, receive, send)
+        return
+    if scope["type"] == "http":
+        await send_json(send, 404, {"error": "Not found; install asgiref to serve the Flask routes here"})
+
+
+def write_stats():
+    return {"pending": len(_write_tasks), "max_pending": ASYNC_MAX_PENDING_WRITES, **_write_counters}
+
+
+@analysis_app.metrics.register_collector
+def collect_lane_metrics():
+    stats = {name: lane.stats() for name, lane in lanes.items()}
+    yield ("async_inference_pending", "gauge", "Analyses queued or running per executor lane",
+           [({"lane": name}, lane["pending"]) for name, lane in stats.items()])
+    yield ("async_inference_shed_total", "counter", "Analyses turned away by admission control", [
+        ({"lane": name, "reason": reason}, lane[reason])
+        for name, lane in stats.items() for reason in ("rejected", "timed_out")
+    ])
+    writes = write_stats()
+    yield ("async_write_pending", "gauge", "Background analysis writes in flight", [({}, writes["pending"])])
+    yield ("async_write_documents_total", "counter", "Background analysis writes by outcome",
+           [({"outcome": outcome}, writes[outcome]) for outcome in ("written", "failed", "shed")])
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class Saturated(Exception):
+    # The lane already has max_pending requests queued or running
+    pass
+
+
+class QueueTimeout(Exception):
+    # The request waited longer than max_queue_ms before a worker picked it up
+    pass
+
+
+def _call_before(deadline, fn, *args):
+    # Runs in the worker. Backstop for jobs that could no longer be cancelled
+    # when the caller timed out (a process pool hands a few jobs to its call
+    # queue ahead of time): they are dropped instead of burning CPU.
+    # time.monotonic() is system-wide, so this also holds in worker processes.
+    if deadline is not None and time.monotonic() > deadline:
+        raise QueueTimeout()
+    return fn(*args)
+
+
+class InferenceLane:
+    # A bounded executor with admission control for CPU-bound analysis called
+    # from asyncio. Requests past max_pending are rejected up front rather
+    # than queued, and requests still queued after max_queue_ms are answered
+    # with QueueTimeout right then and their job is cancelled.
+    def __init__(self, name, workers, max_pending, max_queue_ms=None, kind="thread"):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_queue_ms = max_queue_ms
+        self.kind = kind
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._errors = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        # Fork after the models are loaded so workers share them copy-on-write
+                        context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+                        self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+                    else:
+                        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"inference-{self.name}")
+        return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise Saturated(self.name)
+            self._pending += 1
+
+        deadline = None
+        if self.max_queue_ms:
+            deadline = time.monotonic() + self.max_queue_ms / 1000.0
+        job = None
+        try:
+            job = self._get_executor().submit(_call_before, deadline, fn, *args)
+            result = asyncio.wrap_future(job)
+            if deadline is not None:
+                await asyncio.wait([result], timeout=max(0.0, deadline - time.monotonic()))
+                # Still queued at the deadline: drop it. A job that already
+                # started runs to completion.
+                if not result.done() and job.cancel():
+                    raise QueueTimeout()
+            return await result
+        except asyncio.CancelledError:
+            # The caller went away; do not run work nobody will read
+            if job is not None:
+                job.cancel()
+            raise
+        except QueueTimeout:
+            with self._lock:
+                self._timed_out += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "max_queue_ms": self.max_queue_ms,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "errors": self._errors,
+            }
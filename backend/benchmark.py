@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Measure the analysis itself: no cached results, no index build, and models
+# installed below instead of loaded at import. Any of these can be
+# overridden from the environment.
+os.environ.setdefault("STARTUP_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE", "0")
+os.environ.setdefault("MONGO_CREATE_INDEXES", "0")
+os.environ.setdefault("INFERENCE_BATCHING", "0")
+
+import app as analysis_app
+
+FILLER_WORDS = [
+    "today", "work", "home", "the", "and", "a", "to", "my", "it", "was", "with",
+    "friend", "morning", "evening", "because", "about", "think", "again", "still",
+    "walk", "dinner", "phone", "week", "class", "boss", "family", "just", "some",
+]
+
+PROFILES = {
+    # (min words, max words, share of words drawn from the lexicons)
+    "short": (5, 15, 0.2),
+    "long": (300, 600, 0.1),
+    "keyword_dense": (30, 60, 0.6),
+}
+
+
+class StubSentimentPipeline:
+    # Deterministic, offline stand-in with the transformers pipeline interface
+    negative = ("sad", "hopeless", "kill", "hurt", "tired", "anxious", "worried", "alone", "stress", "pain")
+
+    def _classify(self, text):
+        text = text.lower()
+        hits = sum(text.count(word) for word in self.negative)
+        label = "NEGATIVE" if hits else "POSITIVE"
+        return {"label": label, "score": min(0.99, 0.6 + 0.05 * hits)}
+
+    def __call__(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return [self._classify(texts)]
+        return [self._classify(text) for text in texts]
+
+
+class _StubToken:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _StubDoc(list):
+    ents = ()
+
+
+class StubNLP:
+    # Regex tokenizer used when spaCy itself is not installed
+    _token = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+
+    def make_doc(self, text):
+        return _StubDoc(_StubToken(token) for token in self._token.findall(text))
+
+    __call__ = make_doc
+
+    def pipe(self, texts, **kwargs):
+        return (self.make_doc(text) for text in texts)
+
+
+class FakeCollection:
+    # Minimal in-memory stand-in for the pymongo calls on the write path
+    def __init__(self):
+        self.documents = []
+
+    def insert_one(self, doc):
+        self.documents.append(doc)
+
+    def insert_many(self, docs, ordered=True):
+        self.documents.extend(docs)
+
+    def bulk_write(self, requests, ordered=True):
+        return None
+
+    def find_one(self, *args, **kwargs):
+        return self.documents[0] if self.documents else None
+
+    def create_index(self, *args, **kwargs):
+        return None
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = defaultdict(FakeCollection)
+
+    def __getitem__(self, name):
+        return self._collections[name]
+
+
+class FakeClient:
+    def __init__(self):
+        self._databases = defaultdict(FakeDatabase)
+
+    def __getitem__(self, name):
+        return self._databases[name]
+
+
+def install_stubs(real_models=False):
+    # The in-memory client keeps Mongo latency out of the numbers; only the
+    # cost of building and handing over documents is measured
+    analysis_app.install_mongo_client(FakeClient())
+    if real_models:
+        analysis_app.warm_up()
+        return {"models": "real", "database": "fake"}
+
+    try:
+        import spacy
+        nlp, nlp_name = spacy.blank("en"), "spacy.blank(en)"
+    except ImportError:
+        nlp, nlp_name = StubNLP(), "regex-stub"
+    analysis_app.install_models(sentiment_pipeline=StubSentimentPipeline(), nlp=nlp)
+    return {"models": f"stub ({nlp_name})", "database": "fake"}
+
+
+def build_corpus(size_per_profile, seed):
+    rng = random.Random(seed)
+    lexicon = sorted({
+        phrase
+        for phrases in analysis_app.concern_categories.values()
+        for phrase in phrases
+    } | set(analysis_app.severity_words) | set(analysis_app.intensity_modifiers))
+    corpus = {}
+    for profile, (min_words, max_words, keyword_share) in PROFILES.items():
+        texts = []
+        for _ in range(size_per_profile):
+            words = [
+                rng.choice(lexicon) if rng.random() < keyword_share else rng.choice(FILLER_WORDS)
+                for _ in range(rng.randint(min_words, max_words))
+            ]
+            texts.append("I " + " ".join(words) + ".")
+        corpus[profile] = texts
+    return corpus
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4),
+        "p50_ms": round(rank(50) * 1000, 4),
+        "p90_ms": round(rank(90) * 1000, 4),
+        "p99_ms": round(rank(99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+    }
+
+
+def bench_single(texts, warmup):
+    for text in texts[:warmup]:
+        analysis_app.analyze_mental_health(text)
+    latencies = []
+    stages = defaultdict(list)
+    started = time.perf_counter()
+    for text in texts:
+        timings = {}
+        call_started = time.perf_counter()
+        analysis_app.analyze_mental_health(text, timings)
+        latencies.append(time.perf_counter() - call_started)
+        for stage, seconds in timings.items():
+            stages[stage].append(seconds)
+    elapsed = time.perf_counter() - started
+    return {
+        "end_to_end": percentiles(latencies),
+        "throughput_per_s": round(len(texts) / elapsed, 2) if elapsed else None,
+        "stages": {stage: percentiles(samples) for stage, samples in sorted(stages.items())},
+    }
+
+
+def bench_batched(texts, batch_size):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        call_started = time.perf_counter()
+        analysis_app.analyze_mental_health_batch(texts[i:i + batch_size])
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    return {
+        "batch_size": batch_size,
+        "per_batch": percentiles(latencies),
+        "throughput_per_s": round(len(texts) / elapsed, 2) if elapsed else None,
+    }
+
+
+def bench_http(texts, requests_total, concurrency):
+    # In-process load test of POST /analyze through the Flask test client
+    client = analysis_app.app.test_client()
+    statuses = defaultdict(int)
+
+    def post(i):
+        call_started = time.perf_counter()
+        response = client.post("/analyze", json={"text": texts[i % len(texts)]})
+        return response.status_code, time.perf_counter() - call_started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(post, range(requests_total)))
+    elapsed = time.perf_counter() - started
+    for status, _ in results:
+        statuses[str(status)] += 1
+    if analysis_app.analysis_writer is not None:
+        analysis_app.analysis_writer.flush()
+    return {
+        "requests": requests_total,
+        "concurrency": concurrency,
+        "latency": percentiles([seconds for _, seconds in results]),
+        "requests_per_s": round(requests_total / elapsed, 2) if elapsed else None,
+        "statuses": dict(statuses),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    # Relative change of every p50/p99/throughput figure present in both runs
+    changes = {}
+
+    def walk(old, new, path):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict):
+                walk(old[key], value, path + [key])
+            elif key in ("p50_ms", "p99_ms", "throughput_per_s", "requests_per_s") and old[key]:
+                changes[".".join(path + [key])] = round((value - old[key]) / old[key] * 100, 1)
+
+    walk(baseline["results"], current["results"], [])
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline and the /analyze HTTP layer")
+    parser.add_argument("--size", type=int, default=200, help="Texts per corpus profile")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--http-requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--real-models", action="store_true", help="Load the configured models instead of offline stubs")
+    parser.add_argument("--output", default="-", help="JSON results file, or - for stdout")
+    parser.add_argument("--compare", help="Earlier results file to report percentage changes against")
+    args = parser.parse_args(argv)
+
+    environment = install_stubs(args.real_models)
+    corpus = build_corpus(args.size, args.seed)
+
+    results = {"single": {}, "batched": {}}
+    for profile, texts in corpus.items():
+        results["single"][profile] = bench_single(texts, args.warmup)
+        results["batched"][profile] = bench_batched(texts, args.batch_size)
+    mixed = [text for texts in corpus.values() for text in texts]
+    random.Random(args.seed).shuffle(mixed)
+    results["http"] = bench_http(mixed, args.http_requests, args.concurrency)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "analysis_version": analysis_app.ANALYSIS_VERSION,
+            "settings": {
+                "size": args.size,
+                "seed": args.seed,
+                "batch_size": args.batch_size,
+                "write_mode": analysis_app.ANALYSIS_WRITE_MODE,
+                "inference_batching": analysis_app.INFERENCE_BATCHING,
+                "result_cache": analysis_app.RESULT_CACHE,
+                "spacy_profile": analysis_app.SPACY_PROFILE,
+                **environment,
+            },
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison_pct"] = compare(json.load(f), report)
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        sys.stdout.write(output + "\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
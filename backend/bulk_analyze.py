@@ -0,0 +1,222 @@
+import argparse
+import collections
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+# The CLI writes results itself and each worker runs one batch at a time, so
+# the request-path write-behind buffer and micro-batcher are switched off
+# unless the caller overrides them. Indexes are only created for --mongo
+# runs, so NDJSON-only runs never touch MongoDB
+os.environ.setdefault("STARTUP_MODE", "lazy")
+os.environ.setdefault("ANALYSIS_WRITE_MODE", "disabled")
+os.environ.setdefault("INFERENCE_BATCHING", "0")
+os.environ.setdefault("MONGO_CREATE_INDEXES", "0")
+
+import app as analysis_app
+
+
+# One input record; error is set instead of text when the line could not be
+# turned into a text, and the record comes back as an error record
+Record = collections.namedtuple("Record", ["line", "id", "text", "error"])
+
+
+def read_records(stream, fmt, text_field, id_field=None):
+    # Yields one Record per line so memory stays flat
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield Record(reader.line_num, row.get(id_field) if id_field else None, row.get(text_field) or "", None)
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield Record(line_number, None, None, f"Invalid JSON: {e}")
+            continue
+        if isinstance(record, str):
+            yield Record(line_number, None, record, None)
+        elif isinstance(record, dict):
+            record_id = record.get(id_field) if id_field else None
+            text = record.get(text_field) or ""
+            if isinstance(text, str):
+                yield Record(line_number, record_id, text, None)
+            else:
+                yield Record(line_number, record_id, None, f"Field {text_field!r} is not a string")
+        else:
+            yield Record(line_number, None, None, f"Expected a JSON object or string, got {type(record).__name__}")
+
+
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def error_record(record, error):
+    result = {"error": error, "line": record.line}
+    if record.id is not None:
+        result["id"] = record.id
+    return result
+
+
+def _analyze_one(record):
+    try:
+        return analysis_app.analyze_mental_health(record.text)
+    except Exception as e:
+        return error_record(record, str(e) or type(e).__name__)
+
+
+def analyze_chunk(chunk):
+    # Records that could not be read pass through as error records. If the
+    # batched call fails (e.g. one text is too long), the chunk is retried
+    # one record at a time so only the bad records are lost.
+    valid = [record for record in chunk if record.error is None]
+    try:
+        analyzed = analysis_app.analyze_mental_health_batch([record.text for record in valid])
+    except Exception:
+        analyzed = [_analyze_one(record) for record in valid]
+    analyzed = iter(analyzed)
+    results = []
+    for record in chunk:
+        if record.error is not None:
+            results.append(error_record(record, record.error))
+            continue
+        result = next(analyzed)
+        if record.id is not None:
+            result["id"] = record.id
+        results.append(result)
+    return results
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def run_ordered(chunks, workers, window):
+    # Keeps at most `window` chunks in flight and yields results in input
+    # order. Pool.imap would drain the whole input up front.
+    if workers <= 0:
+        for chunk in chunks:
+            yield analyze_chunk(chunk)
+        return
+
+    # Fork after the models are loaded so workers share them copy-on-write
+    context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    with context.Pool(workers) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(analyze_chunk, (chunk,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class Progress:
+    def __init__(self, stream, every):
+        self.stream = stream
+        self.every = every
+        self.started = time.perf_counter()
+        self.count = 0
+        self.errors = 0
+        self._next_report = every
+
+    def update(self, n, errors=0):
+        self.count += n
+        self.errors += errors
+        if self.every and self.count >= self._next_report:
+            self._next_report = self.count + self.every
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed > 0 else 0
+        label = "done" if final else "progress"
+        self.stream.write(
+            f"[{label}] {self.count} records, {self.errors} errors in {elapsed:.1f}s ({rate:.1f} records/s)\n"
+        )
+        self.stream.flush()
+
+
+def write_docs(collection, docs):
+    collection.insert_many([analysis_app.storage_schema.encode(doc) for doc in docs], ordered=False)
+    analysis_app.after_analyses_written(docs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream NDJSON or CSV records through analyze_mental_health")
+    parser.add_argument("input", nargs="?", default="-", help="Input file, or - for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="Defaults to the input file extension, else ndjson")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", help="Field copied to each result as 'id'")
+    parser.add_argument("--output", default="-", help="NDJSON output file, or - for stdout")
+    parser.add_argument("--mongo", action="store_true", help="Bulk-insert results into the analyses collection")
+    parser.add_argument("--no-output", action="store_true", help="Skip NDJSON output (use with --mongo)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes; 0 runs in-process")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Texts per batched inference call")
+    parser.add_argument("--window", type=int, default=0, help="Chunks in flight (default: 2 per worker)")
+    parser.add_argument("--mongo-batch", type=int, default=1000)
+    parser.add_argument("--progress-every", type=int, default=1000, help="Report progress every N records; 0 disables")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.input.lower().endswith(".csv") else "ndjson"
+    window = args.window or max(1, args.workers) * 2
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    sink = None
+    if not args.no_output:
+        sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    analysis_app.warm_up()
+    collection = None
+    if args.mongo:
+        analysis_app.ensure_indexes()
+        collection = analysis_app.get_analysis_collection()
+    progress = Progress(sys.stderr, args.progress_every)
+    pending_docs = []
+
+    try:
+        chunks = chunked(read_records(source, fmt, args.text_field, args.id_field), args.chunk_size)
+        for results in run_ordered(chunks, args.workers, window):
+            if sink is not None:
+                for result in results:
+                    sink.write(json.dumps(result, default=_json_default))
+                    sink.write("\n")
+            analyzed = [result for result in results if "error" not in result]
+            if collection is not None:
+                pending_docs.extend(analyzed)
+                if len(pending_docs) >= args.mongo_batch:
+                    docs, pending_docs = pending_docs, []
+                    write_docs(collection, docs)
+            progress.update(len(results), errors=len(results) - len(analyzed))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not None and sink is not sys.stdout:
+            sink.close()
+        # Analyses already done are stored even if the run stops early
+        if collection is not None and pending_docs:
+            write_docs(collection, pending_docs)
+        progress.report(final=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import re
+
+# Splitting long documents into chunks that fit the sentiment model's
+# 512-token window, and combining per-chunk analyses into one result.
+
+# Sentence end: terminal punctuation (plus closing quotes or brackets)
+# followed by whitespace, or a blank line
+_SENTENCE_BREAK = re.compile(r"[.!?]+[\"')\]]*(\s+)|\n\s*\n")
+_WORD = re.compile(r"\S+")
+
+
+class DocumentTooLong(ValueError):
+    pass
+
+
+def sentence_spans(text):
+    start = 0
+    for match in _SENTENCE_BREAK.finditer(text):
+        end = match.start(1) if match.group(1) is not None else match.start()
+        if end > start:
+            yield start, end
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def split_chunks(text, max_words):
+    # Packs whole sentences into (start, end) spans of at most max_words
+    # words; a longer sentence is cut into word windows
+    chunks = []
+    start = end = None
+    words = 0
+    for sentence_start, sentence_end in sentence_spans(text):
+        positions = [match.span() for match in _WORD.finditer(text, sentence_start, sentence_end)]
+        if len(positions) > max_words:
+            if start is not None:
+                chunks.append((start, end))
+                start, words = None, 0
+            for i in range(0, len(positions), max_words):
+                window = positions[i:i + max_words]
+                chunks.append((window[0][0], window[-1][1]))
+            continue
+        if start is not None and words + len(positions) > max_words:
+            chunks.append((start, end))
+            start, words = None, 0
+        if start is None:
+            start = sentence_start
+        end = sentence_end
+        words += len(positions)
+    if start is not None:
+        chunks.append((start, end))
+    return chunks or [(0, len(text))]
+
+
+def chunk_summary(start, end, result, sentiment):
+    # What is kept per chunk: offsets into input_text, not a copy of the text
+    return {
+        "start": start,
+        "end": end,
+        "polarity": result["polarity"],
+        "sentiment_score": round(sentiment.get("score", 0.0), 4),
+        "identified_concerns": result["identified_concerns"],
+        "final_score": result["intensity_analysis"]["final_score"],
+        "risk_level": result["risk_assessment"]["level"],
+    }
+
+
+def combine_chunks(chunks, category_order):
+    # chunks: [(start, end, result, sentiment)] in document order. Polarity
+    # is the length-weighted mean of the signed sentiment scores; intensity
+    # and risk follow the worst chunk; keywords and concerns are merged.
+    signed = 0.0
+    total = 0
+    keywords = {'entities': [], 'emotions': [], 'symptoms': [], 'actions': []}
+    concerns = set()
+    factors = []
+    peak = None
+    for start, end, result, sentiment in chunks:
+        weight = max(1, end - start)
+        score = sentiment.get("score", 0.0)
+        signed += weight * (-score if result["polarity"] == "NEGATIVE" else score)
+        total += weight
+        for kind, values in result["detected_keywords"].items():
+            keywords.setdefault(kind, []).extend(values)
+        concerns.update(result["identified_concerns"])
+        for factor in result["risk_assessment"]["factors"]:
+            if factor not in factors:
+                factors.append(factor)
+        if peak is None or result["intensity_analysis"]["final_score"] > peak["intensity_analysis"]["final_score"]:
+            peak = result
+
+    concerns.discard("General Mental Health")
+    ordered = [category for category in category_order if category in concerns]
+    scores = [result["intensity_analysis"]["final_score"] for _, _, result, _ in chunks]
+    intensity = dict(peak["intensity_analysis"])
+    intensity["mean_score"] = round(sum(scores) / len(scores), 1)
+    return {
+        "polarity": "NEGATIVE" if signed < 0 else "POSITIVE",
+        "detected_keywords": keywords,
+        "identified_concerns": ordered or ["General Mental Health"],
+        "intensity_analysis": intensity,
+        "risk_assessment": {"level": "HIGH" if factors else "LOW", "factors": factors},
+        "chunks": [chunk_summary(*chunk) for chunk in chunks],
+    }
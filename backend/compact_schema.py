@@ -0,0 +1,268 @@
+import hashlib
+import threading
+import zlib
+
+import pymongo
+
+# Storage schemas for analyses. "full" stores the API shape as-is. "compact"
+# uses short field names, small-int codes for polarity, risk level and
+# concern categories, positional arrays for the keyword lists and the
+# intensity breakdown, and optionally a hash or zlib stream instead of the
+# raw text. Either schema expands back to the API shape on read, and maps
+# API field paths to stored ones for queries, indexes and aggregations.
+
+COMPACT_SCHEMA_VERSION = 1
+TEXT_MODES = ("plain", "hash", "zlib")
+
+# API path -> compact field
+COMPACT_FIELDS = {
+    "timestamp": "ts",
+    "input_text": "t",
+    "polarity": "p",
+    "identified_concerns": "c",
+    "risk_assessment.level": "r",
+    "risk_assessment.factors": "rf",
+    "intensity_analysis.final_score": "s",
+    "intensity_analysis": "i",
+    "detected_keywords": "k",
+    "lexicon_version": "lv",
+    "user_id": "u",
+    "session_id": "sid",
+}
+
+POLARITY_CODES = {"NEGATIVE": 0, "POSITIVE": 1}
+RISK_LEVEL_CODES = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+RISK_FACTOR_CODES = {"High-risk words detected": 0, "Concerning actions detected": 1}
+# Positional layouts; final_score is stored on its own as "s"
+INTENSITY_FIELDS = ("base_severity", "modifiers", "concern_count", "sentiment_impact", "repetition_impact")
+KEYWORD_KINDS = ("entities", "emotions", "symptoms", "actions")
+# Top-level result keys the compact encoding handles; anything else is kept
+# verbatim under "x"
+_ENCODED_KEYS = {
+    "_id", "timestamp", "input_text", "polarity", "identified_concerns", "risk_assessment",
+    "intensity_analysis", "detected_keywords", "lexicon_version", "user_id", "session_id",
+}
+
+
+def _encode(codes, value):
+    # Unknown labels (e.g. from another sentiment model) are stored as-is
+    return codes.get(value, value)
+
+
+def _decoder(codes):
+    names = {code: name for name, code in codes.items()}
+    return lambda value: names.get(value, value)
+
+
+decode_polarity = _decoder(POLARITY_CODES)
+decode_risk_level = _decoder(RISK_LEVEL_CODES)
+decode_risk_factor = _decoder(RISK_FACTOR_CODES)
+
+
+class CategoryRegistry:
+    # Stable small-int ids for concern categories, kept in MongoDB so they
+    # agree across processes and survive lexicon edits. Ids are assigned on
+    # first use and cached; the collection holds one {_id: name, id: n} per
+    # category plus the "__next_id__" counter.
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = {}
+
+    def _refresh(self):
+        for doc in self.get_collection().find({"_id": {"$ne": "__next_id__"}}):
+            self._ids[doc["_id"]] = doc["id"]
+            self._names[doc["id"]] = doc["_id"]
+
+    def id_for(self, name):
+        category_id = self._ids.get(name)
+        if category_id is not None:
+            return category_id
+        with self._lock:
+            self._refresh()
+            if name not in self._ids:
+                collection = self.get_collection()
+                counter = collection.find_one_and_update(
+                    {"_id": "__next_id__"}, {"$inc": {"next": 1}},
+                    upsert=True, return_document=pymongo.ReturnDocument.AFTER
+                )
+                try:
+                    collection.insert_one({"_id": name, "id": counter["next"] - 1})
+                except pymongo.errors.DuplicateKeyError:
+                    # Another process registered it first
+                    pass
+                self._refresh()
+            return self._ids[name]
+
+    def ids_for(self, names):
+        return [self.id_for(name) for name in names]
+
+    def find_id(self, name):
+        # Read-only lookup for queries: None for categories never stored
+        if name not in self._ids:
+            with self._lock:
+                self._refresh()
+        return self._ids.get(name)
+
+    def name_for(self, category_id):
+        name = self._names.get(category_id)
+        if name is None:
+            with self._lock:
+                self._refresh()
+            name = self._names.get(category_id, f"#{category_id}")
+        return name
+
+
+class FullSchema:
+    name = "full"
+
+    def field(self, path):
+        return path
+
+    def encode(self, doc):
+        return doc
+
+    def expand(self, doc):
+        return doc
+
+    def projection(self, projection):
+        return projection
+
+    def risk_level_value(self, level):
+        return level
+
+    def concern_values(self, names):
+        return list(names)
+
+    def decode_concern(self, value):
+        return value
+
+    def decode_risk_level(self, value):
+        return value
+
+
+FULL_SCHEMA = FullSchema()
+
+
+class CompactSchema:
+    name = "compact"
+
+    def __init__(self, registry, text_mode="plain"):
+        if text_mode not in TEXT_MODES:
+            raise ValueError(f"Unknown compact text mode {text_mode!r}, expected one of {list(TEXT_MODES)}")
+        self.registry = registry
+        self.text_mode = text_mode
+
+    def field(self, path):
+        # Longest mapped prefix, so e.g. "risk_assessment.level" -> "r"; _id
+        # is the same in both schemas
+        if path == "_id":
+            return path
+        parts = path.split(".")
+        for i in range(len(parts), 0, -1):
+            prefix = ".".join(parts[:i])
+            if prefix in COMPACT_FIELDS:
+                return ".".join([COMPACT_FIELDS[prefix]] + parts[i:])
+        return f"x.{path}"
+
+    def risk_level_value(self, level):
+        return _encode(RISK_LEVEL_CODES, level)
+
+    def concern_values(self, names):
+        ids = [self.registry.find_id(name) for name in names]
+        return [category_id for category_id in ids if category_id is not None]
+
+    def decode_concern(self, value):
+        return self.registry.name_for(value)
+
+    def decode_risk_level(self, value):
+        return decode_risk_level(value)
+
+    def encode(self, doc):
+        intensity = dict(doc.get("intensity_analysis", {}))
+        risk = doc.get("risk_assessment", {})
+        stored = {"v": COMPACT_SCHEMA_VERSION, "ts": doc["timestamp"]}
+        if "_id" in doc:
+            stored["_id"] = doc["_id"]
+
+        text = doc.get("input_text")
+        if text is not None:
+            if self.text_mode == "hash":
+                stored["th"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            elif self.text_mode == "zlib":
+                stored["tz"] = zlib.compress(text.encode("utf-8"))
+            else:
+                stored["t"] = text
+
+        stored["p"] = _encode(POLARITY_CODES, doc.get("polarity"))
+        stored["c"] = self.registry.ids_for(doc.get("identified_concerns", []))
+        stored["r"] = _encode(RISK_LEVEL_CODES, risk.get("level"))
+        if risk.get("factors"):
+            stored["rf"] = [_encode(RISK_FACTOR_CODES, factor) for factor in risk["factors"]]
+        stored["s"] = intensity.pop("final_score", None)
+        if intensity:
+            stored["i"] = [intensity.pop(field, None) for field in INTENSITY_FIELDS]
+        keywords = doc.get("detected_keywords")
+        if keywords and any(keywords.values()):
+            stored["k"] = [keywords.get(kind, []) for kind in KEYWORD_KINDS]
+        for field in ("lexicon_version", "user_id", "session_id"):
+            if doc.get(field) is not None:
+                stored[COMPACT_FIELDS[field]] = doc[field]
+
+        extra = {key: value for key, value in doc.items() if key not in _ENCODED_KEYS}
+        if intensity:
+            # Breakdown fields outside INTENSITY_FIELDS, e.g. mean_score
+            extra["intensity_analysis"] = intensity
+        if extra:
+            stored["x"] = extra
+        return stored
+
+    def expand(self, doc):
+        # Rebuilds the API shape from whatever fields a projection kept;
+        # documents written with the full schema pass through unchanged
+        if "v" not in doc:
+            return doc
+        extra = doc.get("x", {})
+        result = {}
+        if "_id" in doc:
+            result["_id"] = doc["_id"]
+
+        if "t" in doc:
+            result["input_text"] = doc["t"]
+        elif "tz" in doc:
+            result["input_text"] = zlib.decompress(bytes(doc["tz"])).decode("utf-8")
+        elif "th" in doc:
+            result["input_text"] = None
+            result["input_text_sha256"] = doc["th"]
+
+        if "p" in doc:
+            result["polarity"] = decode_polarity(doc["p"])
+        if "k" in doc or "i" in doc:
+            result["detected_keywords"] = dict(zip(KEYWORD_KINDS, doc.get("k", [[] for _ in KEYWORD_KINDS])))
+        if "c" in doc:
+            result["identified_concerns"] = [self.registry.name_for(value) for value in doc["c"]]
+        if "s" in doc or "i" in doc:
+            intensity = dict(zip(INTENSITY_FIELDS, doc["i"])) if "i" in doc else {}
+            intensity["final_score"] = doc.get("s")
+            intensity.update(extra.get("intensity_analysis", {}))
+            result["intensity_analysis"] = intensity
+        if "r" in doc:
+            risk = {"level": decode_risk_level(doc["r"])}
+            if "i" in doc or "rf" in doc:
+                risk["factors"] = [decode_risk_factor(factor) for factor in doc.get("rf", [])]
+            result["risk_assessment"] = risk
+        for field in ("lexicon_version", "user_id", "session_id"):
+            if COMPACT_FIELDS[field] in doc:
+                result[field] = doc[COMPACT_FIELDS[field]]
+        result.update({key: value for key, value in extra.items() if key != "intensity_analysis"})
+        result["timestamp"] = doc.get("ts")
+        return result
+
+    def projection(self, projection):
+        if projection is None:
+            return None
+        stored = {"v": 1}
+        for path, include in projection.items():
+            stored[self.field(path)] = include
+        return stored
@@ -0,0 +1,72 @@
+import multiprocessing
+import os
+
+# Production serving: gunicorn -c gunicorn.conf.py (or python serve.py).
+# Settings come from the environment so deployments never edit this file.
+
+# "asgi:application" with a uvicorn worker class serves the async /analyze path
+wsgi_app = os.environ.get("GUNICORN_APP", "app:app")
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+
+# Import app.py (and load the models, with the default STARTUP_MODE=eager)
+# once in the master; workers are forked from it and share the model pages
+# copy-on-write, so restarting a worker never reloads a model
+preload_app = True
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# gthread workers: enough threads per worker for the inference micro-batcher
+# to fill a batch, unless set explicitly
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if os.environ.get("INFERENCE_BATCHING", "1") == "1":
+    threads = int(os.environ.get("GUNICORN_THREADS", os.environ.get("INFERENCE_MAX_BATCH_SIZE", "16")))
+else:
+    threads = int(os.environ.get("GUNICORN_THREADS", "2"))
+
+# timeout is gunicorn's heartbeat check: a worker silent that long (e.g.
+# stuck in native code) is killed and replaced. With gthread workers the
+# heartbeat comes from the main thread, so it does not limit how long a
+# request runs; app.py enforces REQUEST_TIMEOUT_SECONDS (keep it below this)
+# and answers 504. On shutdown or reload, workers get graceful_timeout to
+# finish in-flight requests
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def pre_fork(server, worker):
+    # Runs in the master: give each worker the lowest slot no live worker
+    # holds, so a replacement takes over the slot (and cores) of the worker
+    # it replaces
+    taken = {getattr(live, "slot", None) for live in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    # Split the cores between workers so intra-op threads don't oversubscribe
+    intra_op_threads = int(os.environ.get("TORCH_NUM_THREADS", max(1, multiprocessing.cpu_count() // workers)))
+    try:
+        import torch
+        torch.set_num_threads(intra_op_threads)
+    except ImportError:
+        pass
+    # The MongoClient, micro-batchers and write-behind writer all notice the
+    # new pid and start fresh in this worker on first use. The analysis
+    # process pool (ANALYSIS_PROCESSES) is forked now, before request threads,
+    # and pinned to this worker's slice of the cores
+    import app
+    if app.analysis_engine is not None:
+        app.analysis_engine.set_slot(worker.slot, max(server.num_workers, worker.slot + 1))
+        app.analysis_engine.start()
+
+
+def worker_exit(server, worker):
+    # Drain buffered analyses before the worker goes away
+    import app
+    if app.analysis_writer is not None:
+        app.analysis_writer.close(timeout=graceful_timeout)
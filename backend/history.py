@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import datetime
+
+import pymongo
+from bson import ObjectId
+
+from compact_schema import FULL_SCHEMA
+
+# Compound indexes backing /history: newest-first paging, optionally narrowed
+# by risk level or concern. _id breaks ties between equal timestamps. Keys
+# are API field paths; the storage schema maps them to stored fields.
+HISTORY_INDEXES = [
+    ([("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], "history_timestamp"),
+    ([("risk_assessment.level", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], "history_risk_level"),
+    ([("identified_concerns", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], "history_concerns"),
+]
+
+HISTORY_SORT = [("timestamp", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+# List views skip input_text and the keyword payloads
+HISTORY_PROJECTIONS = {
+    "summary": {
+        "timestamp": 1,
+        "polarity": 1,
+        "identified_concerns": 1,
+        "risk_assessment.level": 1,
+        "intensity_analysis.final_score": 1,
+    },
+    "full": None,
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# MongoDB error codes for an index name that exists with other keys/options
+INDEX_CONFLICTS = (85, 86)
+
+
+def ensure_history_indexes(collection, schema=FULL_SCHEMA):
+    for keys, name in HISTORY_INDEXES:
+        if schema is not FULL_SCHEMA:
+            # Own names, so switching schemas adds indexes instead of
+            # conflicting with the existing ones
+            name = f"{name}_{schema.name}"
+        keys = [(schema.field(path), order) for path, order in keys]
+        try:
+            collection.create_index(keys, name=name)
+        except pymongo.errors.OperationFailure as e:
+            if e.code not in INDEX_CONFLICTS:
+                raise
+            # Built from an older definition of the same index; replace it
+            collection.drop_index(name)
+            collection.create_index(keys, name=name)
+
+
+def project_document(doc, projection):
+    # In-process counterpart of a MongoDB inclusion projection, for results
+    # that never went through a query
+    if projection is None:
+        return doc
+    projected = {}
+    for path in projection:
+        source, target = doc, projected
+        *parents, leaf = path.split(".")
+        for part in parents:
+            source = source.get(part)
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(part, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return projected
+
+
+def encode_cursor(doc):
+    payload = json.dumps([doc["timestamp"].isoformat(), str(doc["_id"])])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def build_history_query(cursor=None, risk_level=None, concerns=None, schema=FULL_SCHEMA):
+    query = {}
+    timestamp_field = schema.field("timestamp")
+    if risk_level:
+        query[schema.field("risk_assessment.level")] = schema.risk_level_value(risk_level)
+    if concerns:
+        query[schema.field("identified_concerns")] = {"$in": schema.concern_values(concerns)}
+    if cursor:
+        # Keyset pagination: everything strictly after the last item seen
+        timestamp, object_id = decode_cursor(cursor)
+        query["$or"] = [
+            {timestamp_field: {"$lt": timestamp}},
+            {timestamp_field: timestamp, "_id": {"$lt": object_id}},
+        ]
+    return query
+
+
+def fetch_history_page(collection, limit, cursor=None, risk_level=None, concerns=None, view="summary", schema=FULL_SCHEMA):
+    query = build_history_query(cursor, risk_level, concerns, schema)
+    sort = [(schema.field(path), order) for path, order in HISTORY_SORT]
+    docs = list(
+        collection.find(query, schema.projection(HISTORY_PROJECTIONS[view]))
+        .sort(sort)
+        .limit(limit + 1)
+    )
+    docs = [schema.expand(doc) for doc in docs]
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    items = []
+    for doc in docs[:limit]:
+        doc["id"] = str(doc.pop("_id"))
+        items.append(doc)
+    return items, next_cursor
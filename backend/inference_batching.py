@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    # In-process inference queue: concurrent single-item calls are collected
+    # for up to max_wait_ms (or until max_batch_size items are waiting) and
+    # run through batch_fn as one batched forward pass. batch_fn takes a
+    # list of inputs and returns a list of outputs in the same order.
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._batch_sizes = Counter()
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each process starts its own worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Drain whatever is already waiting before sleeping
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pending = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            items = [item for item, _ in pending]
+            futures = [future for _, future in pending]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(items):
+                    # A short result list would leave callers waiting forever
+                    raise RuntimeError(
+                        f"{self.name}: batch_fn returned {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self._batches += 1
+                self._items += len(items)
+                self._batch_sizes[len(items)] += 1
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            }
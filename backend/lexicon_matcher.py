@@ -0,0 +1,141 @@
+from collections import namedtuple
+
+# pyahocorasick is optional; the pure-Python automaton below is used without it
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+LexiconHit = namedtuple("LexiconHit", ["lexicon", "label", "phrase", "start", "end", "weight"])
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class LexiconMatcher:
+    # Aho-Corasick automaton over every lexicon phrase. A single scan of the
+    # text reports all (overlapping) hits, so cost no longer grows with the
+    # number of categories or phrases.
+    def __init__(self, word_boundary=False):
+        self.word_boundary = word_boundary
+        self._phrases = []
+        self._phrase_ids = {}
+        self._payloads = []
+        self._compiled = False
+
+    def add(self, lexicon, label, phrases, weight=None):
+        for phrase in phrases:
+            phrase = phrase.lower()
+            if not phrase:
+                continue
+            phrase_id = self._phrase_ids.get(phrase)
+            if phrase_id is None:
+                phrase_id = len(self._phrases)
+                self._phrase_ids[phrase] = phrase_id
+                self._phrases.append(phrase)
+                self._payloads.append([])
+            payload = (lexicon, label, weight)
+            if payload not in self._payloads[phrase_id]:
+                self._payloads[phrase_id].append(payload)
+        self._compiled = False
+        return self
+
+    def add_weighted(self, lexicon, weights):
+        # Each phrase is its own label, e.g. severity_words and intensity_modifiers
+        for phrase, weight in weights.items():
+            self.add(lexicon, phrase, [phrase], weight)
+        return self
+
+    def compile(self):
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for phrase_id, phrase in enumerate(self._phrases):
+                automaton.add_word(phrase, phrase_id)
+            if self._phrases:
+                automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            self._build_automaton()
+        self._compiled = True
+        return self
+
+    def _build_automaton(self):
+        goto = [{}]
+        outputs = [[]]
+        for phrase_id, phrase in enumerate(self._phrases):
+            state = 0
+            for char in phrase:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(phrase_id)
+
+        # Breadth-first failure links; outputs are merged along the chain so
+        # the scan never has to follow it
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def _scan(self, text):
+        # Yields (end_index_exclusive, phrase_id) for every occurrence
+        if ahocorasick is not None:
+            if not self._phrases:
+                return
+            for end, phrase_id in self._automaton.iter(text):
+                yield end + 1, phrase_id
+            return
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for phrase_id in outputs[state]:
+                yield index + 1, phrase_id
+
+    def _on_boundary(self, text, start, end):
+        if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+            return False
+        if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+            return False
+        return True
+
+    def find(self, text):
+        # Matches are case-sensitive against the automaton's lowercased
+        # phrases, so callers pass lowercased text; offsets index into it
+        if not self._compiled:
+            self.compile()
+        hits = []
+        for end, phrase_id in self._scan(text):
+            phrase = self._phrases[phrase_id]
+            start = end - len(phrase)
+            if self.word_boundary and not self._on_boundary(text, start, end):
+                continue
+            for lexicon, label, weight in self._payloads[phrase_id]:
+                hits.append(LexiconHit(lexicon, label, phrase, start, end, weight))
+        return hits
+
+
+def group_hits(hits):
+    # {lexicon: {label: weight}} with each label counted once
+    grouped = {}
+    for hit in hits:
+        grouped.setdefault(hit.lexicon, {})[hit.label] = hit.weight
+    return grouped
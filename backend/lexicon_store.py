@@ -0,0 +1,266 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+# Lexicons live in lexicons.json and are compiled into a binary artifact:
+#
+#   header | string table | phrase index | per-phrase weights + flags |
+#   per-phrase category bitsets | ordered member lists
+#
+# Every phrase is stored once and referenced by id. Processes open the
+# artifact with mmap (read-only), so the page cache holds one copy however
+# many workers there are. Rebuild after editing the source:
+#
+#   python lexicon_store.py build [lexicons.json] [lexicons.bin]
+
+MAGIC = b"MHLX"
+FORMAT_VERSION = 1
+
+# magic, format, version (12 ascii hex chars), phrase count, category count,
+# 64-bit words per bitset, then the offset of every section
+HEADER = struct.Struct("<4sH12sIIIIIIII")
+STRING_ENTRY = struct.Struct("<II")
+# severity weight, modifier weight, flags
+WEIGHT_ENTRY = struct.Struct("<hhB")
+
+# Flag bits in the weights section
+HAS_SEVERITY = 1
+HAS_MODIFIER = 2
+HIGH_RISK = 4
+EMOTION = 8
+SYMPTOM = 16
+ACTION = 32
+
+# Lexicons other than the concern categories, in artifact order
+WEIGHTED_LEXICONS = ("severity_words", "intensity_modifiers")
+WORD_LISTS = ("high_risk_words", "emotion_patterns", "symptom_patterns", "action_patterns")
+LIST_FLAGS = {"high_risk_words": HIGH_RISK, "emotion_patterns": EMOTION, "symptom_patterns": SYMPTOM, "action_patterns": ACTION}
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE = os.path.join(BACKEND_DIR, "lexicons.json")
+DEFAULT_ARTIFACT = os.path.join(BACKEND_DIR, "lexicons.bin")
+
+
+class LexiconError(ValueError):
+    pass
+
+
+def _unique(phrases, where, duplicates):
+    # Phrases are matched against lowercased text, so they are stored lowercased
+    seen = set()
+    result = []
+    for phrase in phrases:
+        phrase = phrase.lower()
+        if phrase in seen:
+            duplicates.append(f"{where}: {phrase!r}")
+            continue
+        seen.add(phrase)
+        result.append(phrase)
+    return result
+
+
+def load_source(path=DEFAULT_SOURCE):
+    # Returns (lexicons, duplicates); repeated phrases within a list are
+    # dropped, keeping the first occurrence
+    with open(path, encoding="utf-8") as f:
+        source = json.load(f)
+
+    duplicates = []
+    lexicons = {"concern_categories": {}}
+    for category, phrases in source["concern_categories"].items():
+        lexicons["concern_categories"][category] = _unique(phrases, category, duplicates)
+    for name in WEIGHTED_LEXICONS:
+        weights = source[name]
+        for phrase, weight in weights.items():
+            if not isinstance(weight, int) or not -32768 <= weight <= 32767:
+                raise LexiconError(f"{name}: weight for {phrase!r} must be a 16-bit integer")
+        lexicons[name] = {phrase.lower(): weight for phrase, weight in weights.items()}
+    for name in WORD_LISTS:
+        lexicons[name] = _unique(source[name], name, duplicates)
+    return lexicons, duplicates
+
+
+def lexicon_version(lexicons):
+    canonical = json.dumps([FORMAT_VERSION, lexicons], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def compile_lexicons(lexicons, path):
+    categories = list(lexicons["concern_categories"])
+    words = (len(categories) + 63) // 64
+
+    # Intern every phrase once, in first-seen order
+    phrase_ids = {}
+    def intern(phrase):
+        if phrase not in phrase_ids:
+            phrase_ids[phrase] = len(phrase_ids)
+        return phrase_ids[phrase]
+
+    lists = []
+    for category in categories:
+        lists.append([intern(phrase) for phrase in lexicons["concern_categories"][category]])
+    for name in WEIGHTED_LEXICONS:
+        lists.append([intern(phrase) for phrase in lexicons[name]])
+    for name in WORD_LISTS:
+        lists.append([intern(phrase) for phrase in lexicons[name]])
+    phrases = list(phrase_ids)
+
+    masks = [0] * len(phrases)
+    for bit, members in enumerate(lists[:len(categories)]):
+        for phrase_id in members:
+            masks[phrase_id] |= 1 << bit
+    severity = [0] * len(phrases)
+    modifier = [0] * len(phrases)
+    flags = [0] * len(phrases)
+    for phrase, weight in lexicons["severity_words"].items():
+        severity[phrase_ids[phrase]] = weight
+        flags[phrase_ids[phrase]] |= HAS_SEVERITY
+    for phrase, weight in lexicons["intensity_modifiers"].items():
+        modifier[phrase_ids[phrase]] = weight
+        flags[phrase_ids[phrase]] |= HAS_MODIFIER
+    for name, flag in LIST_FLAGS.items():
+        for phrase in lexicons[name]:
+            flags[phrase_ids[phrase]] |= flag
+
+    strings = bytearray()
+    index = bytearray()
+    for text in phrases + categories:
+        encoded = text.encode("utf-8")
+        index += STRING_ENTRY.pack(len(strings), len(encoded))
+        strings += encoded
+    weights = b"".join(WEIGHT_ENTRY.pack(s, m, f) for s, m, f in zip(severity, modifier, flags))
+    bitsets = b"".join(mask.to_bytes(8 * words, "little") for mask in masks)
+    members = b"".join(struct.pack(f"<I{len(ids)}I", len(ids), *ids) for ids in lists)
+
+    offset = HEADER.size
+    offsets = []
+    for section in (strings, index, weights, bitsets, members):
+        offsets.append(offset)
+        offset += len(section)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, lexicon_version(lexicons).encode("ascii"),
+        len(phrases), len(categories), words, *offsets
+    )
+
+    # Write then rename so concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for section in (header, strings, index, weights, bitsets, members):
+            f.write(section)
+    os.replace(tmp_path, path)
+    return path
+
+
+class LexiconArtifact:
+    # Read-only view of a compiled artifact through mmap. The Python lexicon
+    # structures are decoded once; weights and category bitsets are read
+    # straight from the mapping.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.signature = (stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if len(view) < HEADER.size:
+            raise LexiconError(f"{path}: truncated lexicon artifact")
+        (magic, fmt, version, self.phrase_count, self.category_count, self._words,
+         self._strings_at, self._index_at, self._weights_at, self._bitsets_at, self._lists_at) = HEADER.unpack_from(view)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise LexiconError(f"{path}: not a version {FORMAT_VERSION} lexicon artifact")
+        self.version = version.decode("ascii")
+        self._view = view
+
+        strings = [self._string(i) for i in range(self.phrase_count + self.category_count)]
+        self.phrases = strings[:self.phrase_count]
+        self.categories = strings[self.phrase_count:]
+        self.phrase_ids = {phrase: i for i, phrase in enumerate(self.phrases)}
+        self._lists = self._read_lists(self.category_count + len(WEIGHTED_LEXICONS) + len(WORD_LISTS))
+
+    def _string(self, i):
+        start, length = STRING_ENTRY.unpack_from(self._view, self._index_at + i * STRING_ENTRY.size)
+        start += self._strings_at
+        return str(self._view[start:start + length], "utf-8")
+
+    def _read_lists(self, count):
+        lists = []
+        offset = self._lists_at
+        for _ in range(count):
+            (length,) = struct.unpack_from("<I", self._view, offset)
+            lists.append(struct.unpack_from(f"<{length}I", self._view, offset + 4))
+            offset += 4 + 4 * length
+        return lists
+
+    def weights(self, phrase_id):
+        # (severity, modifier, flags)
+        return WEIGHT_ENTRY.unpack_from(self._view, self._weights_at + phrase_id * WEIGHT_ENTRY.size)
+
+    def category_mask(self, phrase_id):
+        start = self._bitsets_at + phrase_id * 8 * self._words
+        return int.from_bytes(self._view[start:start + 8 * self._words], "little")
+
+    def categories_for(self, phrases):
+        # Categories of any of the phrases, in lexicon order
+        mask = 0
+        for phrase in phrases:
+            phrase_id = self.phrase_ids.get(phrase)
+            if phrase_id is not None:
+                mask |= self.category_mask(phrase_id)
+        return [category for bit, category in enumerate(self.categories) if mask >> bit & 1]
+
+    def to_lexicons(self):
+        # Same shape as load_source()
+        phrases = self.phrases
+        lists = iter(self._lists)
+        lexicons = {"concern_categories": {
+            category: [phrases[i] for i in next(lists)] for category in self.categories
+        }}
+        for name, index in zip(WEIGHTED_LEXICONS, (0, 1)):
+            lexicons[name] = {phrases[i]: self.weights(i)[index] for i in next(lists)}
+        for name in WORD_LISTS:
+            lexicons[name] = [phrases[i] for i in next(lists)]
+        return lexicons
+
+
+def open_artifact(path=DEFAULT_ARTIFACT, source_path=DEFAULT_SOURCE):
+    # Rebuilds the artifact first when the source is newer, so a fresh
+    # checkout or an edited lexicons.json works without a separate build
+    if source_path and os.path.exists(source_path):
+        if not os.path.exists(path) or os.path.getmtime(source_path) > os.path.getmtime(path):
+            lexicons, _ = load_source(source_path)
+            compile_lexicons(lexicons, path)
+    return LexiconArtifact(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile lexicons.json into the binary lexicon artifact")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build")
+    build.add_argument("source", nargs="?", default=DEFAULT_SOURCE)
+    build.add_argument("artifact", nargs="?", default=DEFAULT_ARTIFACT)
+    show = subcommands.add_parser("show")
+    show.add_argument("artifact", nargs="?", default=DEFAULT_ARTIFACT)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        lexicons, duplicates = load_source(args.source)
+        for duplicate in duplicates:
+            sys.stderr.write(f"dropped duplicate {duplicate}\n")
+        compile_lexicons(lexicons, args.artifact)
+    artifact = LexiconArtifact(args.artifact)
+    sys.stdout.write(json.dumps({
+        "path": args.artifact,
+        "version": artifact.version,
+        "phrases": artifact.phrase_count,
+        "categories": artifact.category_count,
+        "bytes": artifact.signature[1],
+    }) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker by _init_worker
+worker_core = None
+
+
+def _init_worker(counter, cores, threads, on_start):
+    # Runs once in every worker: take the next core, fix the intra-op thread
+    # count, then let the caller adjust per-process state
+    global worker_core
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    if cores:
+        worker_core = cores[index % len(cores)]
+        try:
+            os.sched_setaffinity(0, {worker_core})
+        except OSError:
+            logger.warning("Could not pin analysis worker to core %s", worker_core)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if on_start is not None:
+        on_start()
+
+
+def _noop():
+    return os.getpid()
+
+
+def slice_cores(cores, slot, slots):
+    # Disjoint, near-equal slices of the cores, one per server process; with
+    # more processes than cores each gets one core, shared round-robin
+    if slots <= 1 or not cores:
+        return cores
+    if slots > len(cores):
+        return [cores[slot % len(cores)]]
+    per, extra = divmod(len(cores), slots)
+    start = slot * per + min(slot, extra)
+    return cores[start:start + per + (slot < extra)]
+
+
+class ProcessEngine:
+    # A pool of forked worker processes for CPU-bound analysis. Workers are
+    # forked after the models are loaded, so they share the weights
+    # copy-on-write and nothing but texts and result dicts crosses the pipe.
+    # Each worker is pinned to one core (pin_cores) with a fixed number of
+    # intra-op threads. The pool is created per process, on start() or on
+    # first use, like the MongoClient and the background threads. Several
+    # server processes each running a pool call set_slot() so every pool
+    # pins to its own slice of the cores. A pool whose worker died (e.g.
+    # OOM-killed) is replaced and the task retried once.
+    def __init__(self, workers, threads_per_worker=1, pin_cores=True, on_worker_start=None):
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = max(1, int(threads_per_worker))
+        self.pin_cores = pin_cores
+        self.on_worker_start = on_worker_start
+        self.slot = 0
+        self.slots = 1
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._counters = {"tasks": 0, "items": 0, "errors": 0, "restarts": 0}
+
+    def set_slot(self, slot, slots):
+        # This process is server worker `slot` of `slots`; takes effect when
+        # the pool is (re)created
+        self.slot = slot
+        self.slots = max(1, slots)
+
+    def _cores(self):
+        if not self.pin_cores or not hasattr(os, "sched_getaffinity"):
+            return None
+        return slice_cores(sorted(os.sched_getaffinity(0)), self.slot, self.slots)
+
+    def _get_pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+                    counter = context.Value("i", 0)
+                    self._pool = ProcessPoolExecutor(
+                        self.workers, mp_context=context, initializer=_init_worker,
+                        initargs=(counter, self._cores(), self.threads_per_worker, self.on_worker_start)
+                    )
+                    self._pid = os.getpid()
+        return self._pool
+
+    def start(self):
+        # Fork every worker now (e.g. right after warm-up, before request
+        # threads exist) instead of on the first request
+        pool = self._get_pool()
+        for future in [pool.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    def _discard(self, pool):
+        # Drop a broken pool so the next call forks a fresh one
+        with self._lock:
+            if self._pool is pool and self._pid == os.getpid():
+                self._pool = None
+                self._pid = None
+                self._counters["restarts"] += 1
+        pool.shutdown(wait=False)
+        logger.warning("An analysis worker process died; replacing the pool")
+
+    def _retry_broken(self, call):
+        # call(pool) runs once more on a fresh pool if a worker died under
+        # it; a pool that breaks again is dropped too, for the next request
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return call(pool)
+            except BrokenProcessPool:
+                self._discard(pool)
+                if attempt:
+                    raise
+
+    def run(self, fn, *args, items=1):
+        with self._lock:
+            self._counters["tasks"] += 1
+            self._counters["items"] += items
+        try:
+            return self._retry_broken(lambda pool: pool.submit(fn, *args).result())
+        except Exception:
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+
+    def map_shards(self, fn, items, *args):
+        # Splits items into one contiguous shard per worker, one message each
+        # way per shard; results come back in input order. args are passed
+        # to fn after the shard
+        if not items:
+            return []
+        size = -(-len(items) // self.workers)
+        shards = [items[i:i + size] for i in range(0, len(items), size)]
+        with self._lock:
+            self._counters["tasks"] += len(shards)
+            self._counters["items"] += len(items)
+
+        def call(pool):
+            futures = [pool.submit(fn, shard, *args) for shard in shards]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+            return results
+
+        try:
+            return self._retry_broken(call)
+        except Exception:
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=wait)
+            self._pool = None
+            self._pid = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "threads_per_worker": self.threads_per_worker,
+                "pin_cores": self.pin_cores,
+                "slot": self.slot,
+                "slots": self.slots,
+                "started": self._pid == os.getpid(),
+                **self._counters,
+            }
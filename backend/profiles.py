@@ -0,0 +1,104 @@
+import pymongo
+
+# Per-user (or per-session) rolling risk profiles, updated with every stored
+# analysis so escalation checks read one small document instead of
+# aggregating the subject's history.
+#
+# The update is a pipeline update: the exponentially weighted intensity
+# depends on the stored value, which $inc/$mul alone cannot express in one
+# atomic write. Counters and the bounded risk window use $add and
+# $concatArrays + $slice inside the same pipeline.
+
+SUBJECT_FIELDS = ("user_id", "session_id")
+MAX_SUBJECT_LENGTH = 128
+
+
+class InvalidSubject(ValueError):
+    pass
+
+
+def subject_fields(data):
+    # The optional user_id / session_id of a request body or query string
+    subject = {}
+    for field in SUBJECT_FIELDS:
+        value = data.get(field)
+        if value is None or value == "":
+            continue
+        if not isinstance(value, str) or len(value) > MAX_SUBJECT_LENGTH:
+            raise InvalidSubject(f"'{field}' must be a string of at most {MAX_SUBJECT_LENGTH} characters")
+        subject[field] = value
+    return subject
+
+
+def profile_id(analysis):
+    # "user:<id>" takes precedence over "session:<id>"; None when neither is set
+    for field in SUBJECT_FIELDS:
+        value = analysis.get(field)
+        if value:
+            return f"{field.split('_')[0]}:{value}"
+    return None
+
+
+def _counter(path):
+    return {"$add": [{"$ifNull": [f"${path}", 0]}, 1]}
+
+
+def profile_update(analysis, alpha, window):
+    score = analysis["intensity_analysis"]["final_score"]
+    level = analysis["risk_assessment"]["level"]
+    fields = {
+        "count": _counter("count"),
+        # First analysis seeds the average; later ones blend in with weight alpha
+        "ewma_intensity": {"$cond": [
+            {"$gt": [{"$ifNull": ["$count", 0]}, 0]},
+            {"$add": [{"$multiply": [alpha, score]}, {"$multiply": [1 - alpha, "$ewma_intensity"]}]},
+            score,
+        ]},
+        "last_intensity": score,
+        "recent_risk_levels": {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$recent_risk_levels", []]}, [level]]}, -window
+        ]},
+        f"risk_levels.{level}": _counter(f"risk_levels.{level}"),
+        "first_seen": {"$ifNull": ["$first_seen", analysis["timestamp"]]},
+        "last_seen": analysis["timestamp"],
+    }
+    for concern in analysis["identified_concerns"]:
+        fields[f"concerns.{concern}"] = _counter(f"concerns.{concern}")
+    return pymongo.UpdateOne({"_id": profile_id(analysis)}, [{"$set": fields}], upsert=True)
+
+
+def profile_updates(analyses, alpha, window):
+    # Oldest first, so a batch applies in the same order as single writes
+    subjects = [analysis for analysis in analyses if profile_id(analysis)]
+    subjects.sort(key=lambda analysis: analysis["timestamp"])
+    return [profile_update(analysis, alpha, window) for analysis in subjects]
+
+
+def record_profiles(profiles, analyses, alpha, window):
+    updates = profile_updates(analyses, alpha, window)
+    if updates:
+        # Ordered: updates for the same profile must not be reordered
+        profiles.bulk_write(updates, ordered=True)
+
+
+def escalation_status(profile, high_risk_threshold, ewma_threshold):
+    # Everything needed is in the profile document, so this is O(1)
+    recent = profile.get("recent_risk_levels", [])
+    high_recent = sum(1 for level in recent if level == "HIGH")
+    reasons = []
+    if high_recent >= high_risk_threshold:
+        reasons.append(f"{high_recent} HIGH risk assessments in the last {len(recent)}")
+    if profile.get("ewma_intensity", 0) >= ewma_threshold:
+        reasons.append(f"Weighted intensity {profile['ewma_intensity']:.1f} at or above {ewma_threshold}")
+    return {
+        "escalating": bool(reasons),
+        "reasons": reasons,
+        "high_risk_recent": high_recent,
+        "ewma_intensity": round(profile.get("ewma_intensity", 0), 2),
+        "last_intensity": profile.get("last_intensity"),
+        "recent_risk_levels": recent,
+        "concerns": profile.get("concerns", {}),
+        "count": profile.get("count", 0),
+        "first_seen": profile.get("first_seen"),
+        "last_seen": profile.get("last_seen"),
+    }
@@ -0,0 +1,148 @@
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+# MongoDB error code for an index that exists with other options
+INDEX_OPTIONS_CONFLICT = 85
+
+def cache_key(text, version):
+    # The exact text: unicode or whitespace normalization can change what the
+    # lexicon scan matches and the chunk offsets, so a hit for a "similar"
+    # text could differ from what analyzing this one returns
+    return hashlib.sha256(f"{version}\0{text}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # Content-addressed analysis cache: a bounded in-memory LRU tier with TTL
+    # in front of an optional MongoDB tier expired by a TTL index.
+    def __init__(self, max_entries=10000, ttl_seconds=3600, get_collection=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.get_collection = get_collection
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_ready = False
+        self._counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "persistent_errors": 0,
+        }
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        value = self._get_persistent(key)
+        if value is not None:
+            self._put_memory(key, value)
+            with self._lock:
+                self._counters["persistent_hits"] += 1
+            return copy.deepcopy(value)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        value = copy.deepcopy(value)
+        self._put_memory(key, value)
+        self._put_persistent(key, value)
+
+    def _put_memory(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _ensure_index(self):
+        if self._index_ready:
+            return
+        collection = self.get_collection()
+        try:
+            collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except pymongo.errors.OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # The TTL changed since the index was built; collMod updates it in
+            # place. Reads check expiry themselves, so the tier stays correct
+            # even if that is not permitted.
+            try:
+                collection.database.command("collMod", collection.name, index={
+                    "keyPattern": {"created_at": 1}, "expireAfterSeconds": self.ttl_seconds
+                })
+            except pymongo.errors.OperationFailure:
+                logger.warning("Could not change the TTL of the %s index to %ss", collection.name, self.ttl_seconds)
+        self._index_ready = True
+
+    def _get_persistent(self, key):
+        if self.get_collection is None:
+            return None
+        try:
+            self._ensure_index()
+            doc = self.get_collection().find_one({"_id": key})
+        except pymongo.errors.PyMongoError:
+            with self._lock:
+                self._counters["persistent_errors"] += 1
+            return None
+        if doc is None:
+            return None
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if doc["created_at"] < datetime.utcnow() - timedelta(seconds=self.ttl_seconds):
+            return None
+        return doc["result"]
+
+    def _put_persistent(self, key, value):
+        if self.get_collection is None:
+            return
+        try:
+            self._ensure_index()
+            self.get_collection().replace_one(
+                {"_id": key},
+                {"_id": key, "result": value, "created_at": datetime.utcnow()},
+                upsert=True
+            )
+        except pymongo.errors.PyMongoError:
+            with self._lock:
+                self._counters["persistent_errors"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        hits = counters["memory_hits"] + counters["persistent_hits"]
+        lookups = hits + counters["misses"]
+        counters.update({
+            "hits": hits,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0,
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.get_collection is not None,
+        })
+        return counters
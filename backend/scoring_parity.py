@@ -0,0 +1,92 @@
+import argparse
+import json
+import sys
+from collections import Counter
+
+import benchmark
+from benchmark import analysis_app
+
+# Checks the single-pass token scorer against the list-scanning scorer it
+# replaced, on the benchmark corpus plus hand-picked edge cases:
+#
+#   python scoring_parity.py [--size 500] [--real-models]
+
+EDGE_CASES = [
+    "",
+    "I have skills in management and I am really happy today!",
+    "I can't sleep, I'm always tired and extremely worried.",
+    "cant sleep cant sleep, my head hurts, pain and ache everywhere. I need help.",
+    "Stress stress stress. I am very stressed. Hurt hurt.",
+    "HE WANTS TO HARM OTHERS. Violent thoughts. Die die.",
+    "Sad, SAD, sad... tired-tired; worried?",
+]
+
+
+def legacy_keywords(context):
+    lexicons = context.lexicons
+    keywords = {'entities': [ent.text for ent in context.doc.ents], 'emotions': [], 'symptoms': [], 'actions': []}
+    for token, token_text in zip(context.doc, context.tokens):
+        if token_text in lexicons.emotion_patterns:
+            keywords['emotions'].append(token.text)
+        if token_text in lexicons.symptom_patterns:
+            keywords['symptoms'].append(token.text)
+        if token_text in lexicons.action_patterns:
+            keywords['actions'].append(token.text)
+    for pattern in lexicons.symptom_patterns:
+        if ' ' in pattern and pattern in context.text_lower:
+            keywords['symptoms'].append(pattern)
+    return keywords
+
+
+def legacy_repetition(context):
+    word_counts = Counter([token for token in context.tokens if token in context.lexicons.severity_words])
+    return sum(0.5 for count in word_counts.values() if count > 1)
+
+
+def legacy_risk(context, keywords):
+    risk_level = "LOW"
+    risk_factors = []
+    if "high_risk" in context.lexicon_labels:
+        risk_level = "HIGH"
+        risk_factors.append("High-risk words detected")
+    if keywords['actions']:
+        if any(action.lower() in context.lexicons.high_risk_words for action in keywords['actions']):
+            risk_level = "HIGH"
+            risk_factors.append("Concerning actions detected")
+    return {"level": risk_level, "factors": risk_factors}
+
+
+def check(texts):
+    mismatches = []
+
+    def compare(context, field, expected, actual):
+        if actual != expected:
+            mismatches.append({"text": context.text, "field": field, "expected": expected, "actual": actual})
+
+    for context in analysis_app.build_contexts(texts):
+        expected = legacy_keywords(context)
+        actual = analysis_app.extract_keywords(context)
+        compare(context, "keywords", expected, actual)
+        compare(context, "repetition", legacy_repetition(context), context.token_scores.repetition_bonus)
+        compare(context, "risk", legacy_risk(context, expected), analysis_app.assess_risk(context, actual))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the token scorer with the legacy list-scanning scorer")
+    parser.add_argument("--size", type=int, default=500, help="Texts per corpus profile")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--real-models", action="store_true", help="Tokenize with the configured spaCy model")
+    args = parser.parse_args(argv)
+
+    benchmark.install_stubs(args.real_models)
+    texts = EDGE_CASES + [text for texts in benchmark.build_corpus(args.size, args.seed).values() for text in texts]
+    mismatches = check(texts)
+    for mismatch in mismatches[:20]:
+        sys.stderr.write(json.dumps(mismatch) + "\n")
+    sys.stdout.write(json.dumps({"texts": len(texts), "mismatches": len(mismatches)}) + "\n")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import sys
+
+# Every backend wraps the same fine-tuned checkpoint, so the POSITIVE/NEGATIVE
+# labels calculate_intensity relies on are identical across them
+SENTIMENT_BACKENDS = ("pytorch", "quantized", "onnx")
+SENTIMENT_LABELS = {"POSITIVE", "NEGATIVE"}
+
+# Default corpus for the parity check
+PARITY_SAMPLES = [
+    "I feel so sad and hopeless, I don't know what to do anymore.",
+    "Today was a great day, I finally finished my project!",
+    "I can't sleep at night and I'm always tired.",
+    "I'm worried about my exams but I think I'll be fine.",
+    "Nobody understands me and I feel completely alone.",
+    "I'm grateful for my friends and family.",
+    "I am so angry at everyone right now.",
+    "Things are slowly getting better.",
+    "I want to hurt myself.",
+    "Feeling calm and relaxed after a long walk.",
+    "I'm really stressed about work and everything is overwhelming.",
+    "I love spending time with my dog.",
+]
+
+
+def _check_labels(model):
+    labels = set(model.config.id2label.values())
+    if labels != SENTIMENT_LABELS:
+        raise ValueError(f"Sentiment model labels {sorted(labels)} do not match {sorted(SENTIMENT_LABELS)}")
+
+
+def _load_pytorch(model_name, **options):
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model=model_name)
+
+
+def _load_quantized(model_name, **options):
+    # Dynamic int8 quantization of the Linear layers; weights are quantized
+    # once at load, activations on the fly
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    _check_labels(model)
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
+def _load_onnx(model_name, onnx_path=None, **options):
+    # ONNX Runtime on CPU via optimum. The export is slow, so it is saved to
+    # onnx_path on first use and loaded from there afterwards.
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer, pipeline
+    if onnx_path and os.path.isdir(onnx_path):
+        model = ORTModelForSequenceClassification.from_pretrained(onnx_path, provider="CPUExecutionProvider")
+        tokenizer = AutoTokenizer.from_pretrained(onnx_path)
+    else:
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True, provider="CPUExecutionProvider")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if onnx_path:
+            model.save_pretrained(onnx_path)
+            tokenizer.save_pretrained(onnx_path)
+    _check_labels(model)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
+_loaders = {
+    "pytorch": _load_pytorch,
+    "quantized": _load_quantized,
+    "onnx": _load_onnx,
+}
+
+
+def load_sentiment_pipeline(model_name, backend="pytorch", **options):
+    if backend not in _loaders:
+        raise ValueError(f"Unknown sentiment backend {backend!r}, expected one of {list(SENTIMENT_BACKENDS)}")
+    return _loaders[backend](model_name, **options)
+
+
+def check_parity(texts, candidate, reference, batch_size=16):
+    # Label agreement and score drift of a candidate backend against the
+    # full-precision reference pipeline
+    expected = reference(texts, batch_size=batch_size, truncation=True)
+    actual = candidate(texts, batch_size=batch_size, truncation=True)
+    mismatches = []
+    max_score_delta = 0.0
+    for text, ref, cand in zip(texts, expected, actual):
+        if cand["label"] not in SENTIMENT_LABELS:
+            raise ValueError(f"Backend returned unexpected label {cand['label']!r}")
+        if ref["label"] != cand["label"]:
+            mismatches.append({"text": text, "reference": ref, "candidate": cand})
+        else:
+            max_score_delta = max(max_score_delta, abs(ref["score"] - cand["score"]))
+    return {
+        "samples": len(texts),
+        "label_agreement": (len(texts) - len(mismatches)) / len(texts) if texts else 1.0,
+        "max_score_delta": max_score_delta,
+        "mismatches": mismatches,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a sentiment backend against the PyTorch reference model")
+    parser.add_argument("--backend", choices=SENTIMENT_BACKENDS, required=True)
+    parser.add_argument("--model", default="distilbert-base-uncased-finetuned-sst-2-english")
+    parser.add_argument("--corpus", help="File with one text per line (defaults to a built-in sample)")
+    parser.add_argument("--onnx-path", help="Directory to load or save the exported ONNX model")
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = PARITY_SAMPLES
+
+    reference = load_sentiment_pipeline(args.model, "pytorch")
+    candidate = load_sentiment_pipeline(args.model, args.backend, onnx_path=args.onnx_path)
+    report = check_parity(texts, candidate, reference)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["label_agreement"] >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
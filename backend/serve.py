@@ -0,0 +1,18 @@
+import os
+import sys
+
+# Production entry point: multi-worker gunicorn configured by gunicorn.conf.py.
+# Extra arguments are passed through, e.g. python serve.py --bind :8000
+
+
+def main(argv=None):
+    from gunicorn.app.wsgiapp import run
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.argv = ["gunicorn", "--config", os.path.join(here, "gunicorn.conf.py")] + list(argv if argv is not None else sys.argv[1:])
+    return run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
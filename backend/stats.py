@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import datetime
+
+import pymongo
+
+from compact_schema import FULL_SCHEMA
+
+# Bucket label formats, shared by $dateToString and strftime
+STATS_BUCKETS = {
+    "hour": "%Y-%m-%dT%H:00:00",
+    "day": "%Y-%m-%dT00:00:00",
+}
+
+# Rollup documents hold per-hour counters keyed by "YYYY-MM-DDTHH", so a
+# string range on _id is a time range
+ROLLUP_KEY_FORMAT = "%Y-%m-%dT%H"
+
+
+def _timestamp_match(since=None, until=None, field="timestamp"):
+    match = {}
+    if since:
+        match["$gte"] = since
+    if until:
+        match["$lt"] = until
+    return {field: match} if match else {}
+
+
+def aggregate_stats(collection, bucket="day", since=None, until=None, schema=FULL_SCHEMA):
+    # One pass over the matching analyses; $facet fans it out to the three
+    # aggregations. Grouping runs on stored values (concern ids and risk
+    # codes under the compact schema), which are decoded afterwards.
+    date_format = STATS_BUCKETS[bucket]
+    concerns = "$" + schema.field("identified_concerns")
+    pipeline = [
+        {"$match": _timestamp_match(since, until, schema.field("timestamp"))},
+        {"$facet": {
+            "concerns": [
+                {"$unwind": concerns},
+                {"$group": {"_id": concerns, "count": {"$sum": 1}}},
+            ],
+            "risk_levels": [
+                {"$group": {"_id": "$" + schema.field("risk_assessment.level"), "count": {"$sum": 1}}},
+            ],
+            "score_trend": [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": date_format, "date": "$" + schema.field("timestamp")}},
+                    "avg_final_score": {"$avg": "$" + schema.field("intensity_analysis.final_score")},
+                    "count": {"$sum": 1},
+                }},
+                {"$sort": {"_id": 1}},
+            ],
+        }},
+    ]
+    result = next(collection.aggregate(pipeline), {"concerns": [], "risk_levels": [], "score_trend": []})
+    return {
+        "concern_counts": _sorted_counts({schema.decode_concern(row["_id"]): row["count"] for row in result["concerns"]}),
+        "risk_levels": {schema.decode_risk_level(row["_id"]): row["count"] for row in result["risk_levels"]},
+        "score_trend": [
+            {"bucket": row["_id"], "avg_final_score": round(row["avg_final_score"], 2), "count": row["count"]}
+            for row in result["score_trend"]
+        ],
+    }
+
+
+def rollup_updates(analyses):
+    # Collapse a batch of analyses into one $inc per hour bucket
+    increments = defaultdict(lambda: defaultdict(float))
+    for analysis in analyses:
+        key = analysis["timestamp"].strftime(ROLLUP_KEY_FORMAT)
+        counters = increments[key]
+        counters["count"] += 1
+        counters["score_sum"] += analysis["intensity_analysis"]["final_score"]
+        for concern in analysis["identified_concerns"]:
+            counters[f"concerns.{concern}"] += 1
+        counters[f"risk_levels.{analysis['risk_assessment']['level']}"] += 1
+
+    return [
+        pymongo.UpdateOne(
+            {"_id": key},
+            {
+                "$inc": {field: int(value) if field != "score_sum" else value for field, value in counters.items()},
+                "$setOnInsert": {"bucket": datetime.strptime(key, ROLLUP_KEY_FORMAT)},
+            },
+            upsert=True
+        )
+        for key, counters in increments.items()
+    ]
+
+
+def record_rollups(rollups, analyses):
+    updates = rollup_updates(analyses)
+    if updates:
+        rollups.bulk_write(updates, ordered=False)
+
+
+def rollup_stats(rollups, bucket="day", since=None, until=None):
+    # Same shape as aggregate_stats, computed from the hourly rollups
+    # instead of scanning analyses
+    key_range = {}
+    if since:
+        key_range["$gte"] = since.strftime(ROLLUP_KEY_FORMAT)
+    if until:
+        key_range["$lt"] = until.strftime(ROLLUP_KEY_FORMAT)
+    query = {"_id": key_range} if key_range else {}
+
+    date_format = STATS_BUCKETS[bucket]
+    concern_counts = defaultdict(int)
+    risk_levels = defaultdict(int)
+    trend = defaultdict(lambda: [0, 0.0])
+    for doc in rollups.find(query).sort("_id", pymongo.ASCENDING):
+        for concern, count in doc.get("concerns", {}).items():
+            concern_counts[concern] += count
+        for level, count in doc.get("risk_levels", {}).items():
+            risk_levels[level] += count
+        bucket_totals = trend[datetime.strptime(doc["_id"], ROLLUP_KEY_FORMAT).strftime(date_format)]
+        bucket_totals[0] += doc["count"]
+        bucket_totals[1] += doc["score_sum"]
+
+    return {
+        "concern_counts": _sorted_counts(concern_counts),
+        "risk_levels": dict(risk_levels),
+        "score_trend": [
+            {"bucket": key, "avg_final_score": round(score_sum / count, 2), "count": count}
+            for key, (count, score_sum) in sorted(trend.items()) if count
+        ],
+    }
+
+
+def rebuild_rollups(collection, rollups, batch_size=1000, schema=FULL_SCHEMA):
+    # Replays every stored analysis into fresh rollups, for data written
+    # before rollups existed
+    rollups.delete_many({})
+    projection = {"timestamp": 1, "identified_concerns": 1, "risk_assessment.level": 1, "intensity_analysis.final_score": 1}
+    batch = []
+    for doc in collection.find({}, schema.projection(projection)):
+        batch.append(schema.expand(doc))
+        if len(batch) >= batch_size:
+            record_rollups(rollups, batch)
+            batch = []
+    if batch:
+        record_rollups(rollups, batch)
+
+
+def _sorted_counts(counts):
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
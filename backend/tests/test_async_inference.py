@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from async_inference import InferenceLane, QueueTimeout, Saturated
+
+
+def test_queued_request_times_out_without_waiting_for_the_backlog():
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        lane = InferenceLane("test", workers=1, max_pending=4, max_queue_ms=50)
+        blocker = asyncio.ensure_future(lane.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        with pytest.raises(QueueTimeout):
+            await lane.run(ran.append, "queued")
+        waited = time.monotonic() - started
+        release.set()
+        await blocker
+        lane.shutdown()
+        return waited, lane.stats()
+
+    waited, stats = asyncio.run(scenario())
+    assert waited < 1.0
+    # The timed-out job was cancelled, not run after the backlog cleared
+    assert ran == []
+    assert (stats["timed_out"], stats["pending"]) == (1, 0)
+
+
+def test_running_request_is_not_cut_short():
+    async def scenario():
+        lane = InferenceLane("test", workers=1, max_pending=4, max_queue_ms=20)
+        result = await lane.run(lambda: time.sleep(0.1) or "done")
+        lane.shutdown()
+        return result
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_rejects_past_max_pending():
+    release = threading.Event()
+
+    async def scenario():
+        lane = InferenceLane("test", workers=1, max_pending=1)
+        blocker = asyncio.ensure_future(lane.run(release.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Saturated):
+            await lane.run(len, "x")
+        release.set()
+        await blocker
+        lane.shutdown()
+        return lane.stats()
+
+    assert asyncio.run(scenario())["rejected"] == 1
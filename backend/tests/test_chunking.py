@@ -0,0 +1,68 @@
+from chunking import chunk_summary, combine_chunks, sentence_spans, split_chunks
+
+
+def spans_text(text, spans):
+    return [text[start:end] for start, end in spans]
+
+
+def test_sentence_spans():
+    text = 'I am tired. Why? "Really!" Fine\n\nNew paragraph'
+    assert spans_text(text, sentence_spans(text)) == ["I am tired.", "Why?", '"Really!"', "Fine", "New paragraph"]
+
+
+def test_sentence_spans_keep_decimals_and_trailing_text():
+    text = "It costs 3.50 now. no end"
+    assert spans_text(text, sentence_spans(text)) == ["It costs 3.50 now.", "no end"]
+
+
+def test_split_chunks_packs_whole_sentences():
+    text = "one two three. four five. six seven eight nine. ten."
+    chunks = spans_text(text, split_chunks(text, max_words=5))
+    assert chunks == ["one two three. four five.", "six seven eight nine. ten."]
+
+
+def test_split_chunks_cuts_long_sentences_into_word_windows():
+    text = "short. " + " ".join(f"w{i}" for i in range(7)) + ". tail"
+    chunks = spans_text(text, split_chunks(text, max_words=3))
+    assert chunks == ["short.", "w0 w1 w2", "w3 w4 w5", "w6.", "tail"]
+    assert all(len(chunk.split()) <= 3 for chunk in chunks)
+
+
+def test_split_chunks_of_blank_text():
+    assert split_chunks("", 10) == [(0, 0)]
+    assert split_chunks("   ", 10) == [(0, 3)]
+
+
+def result(polarity, concerns, score, factors=(), keywords=None):
+    return {
+        "polarity": polarity,
+        "detected_keywords": keywords or {"entities": [], "emotions": [], "symptoms": [], "actions": []},
+        "identified_concerns": list(concerns),
+        "intensity_analysis": {"base_severity": score, "final_score": score},
+        "risk_assessment": {"level": "HIGH" if factors else "LOW", "factors": list(factors)},
+    }
+
+
+def test_combine_chunks():
+    chunks = [
+        (0, 100, result("POSITIVE", ["General Mental Health"], 2), {"score": 0.9}),
+        (100, 150, result("NEGATIVE", ["Depression"], 8, ["High-risk words detected"],
+                          {"entities": [], "emotions": ["sad"], "symptoms": [], "actions": []}), {"score": 0.99}),
+        (150, 200, result("NEGATIVE", ["Anxiety", "Depression"], 5), {"score": 0.6}),
+    ]
+    combined = combine_chunks(chunks, ["Anxiety", "Depression", "Stress"])
+    # 100 * 0.9 outweighs 50 * 0.99 + 50 * 0.6
+    assert combined["polarity"] == "POSITIVE"
+    assert combined["identified_concerns"] == ["Anxiety", "Depression"]
+    assert combined["intensity_analysis"] == {"base_severity": 8, "final_score": 8, "mean_score": 5.0}
+    assert combined["risk_assessment"] == {"level": "HIGH", "factors": ["High-risk words detected"]}
+    assert combined["detected_keywords"]["emotions"] == ["sad"]
+    assert [chunk["start"] for chunk in combined["chunks"]] == [0, 100, 150]
+    assert combined["chunks"][1] == chunk_summary(*chunks[1])
+
+
+def test_combine_chunks_without_concerns():
+    combined = combine_chunks([(0, 10, result("NEGATIVE", ["General Mental Health"], 3), {"score": 0.7})], ["Anxiety"])
+    assert combined["identified_concerns"] == ["General Mental Health"]
+    assert combined["polarity"] == "NEGATIVE"
+    assert combined["risk_assessment"] == {"level": "LOW", "factors": []}
@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import pytest
+
+from compact_schema import FULL_SCHEMA, CategoryRegistry, CompactSchema
+
+mongomock = pytest.importorskip("mongomock")
+
+TIMESTAMP = datetime(2024, 5, 1, 12, 30, 15, 123000)
+
+
+def analysis(**overrides):
+    doc = {
+        "input_text": "I feel hopeless and can't sleep",
+        "polarity": "NEGATIVE",
+        "detected_keywords": {"entities": [], "emotions": ["feel"], "symptoms": ["can't sleep"], "actions": []},
+        "identified_concerns": ["Depression", "Insomnia"],
+        "intensity_analysis": {
+            "base_severity": 6, "modifiers": 0, "concern_count": 0.67,
+            "sentiment_impact": 1.2, "repetition_impact": 0, "final_score": 8.0,
+        },
+        "risk_assessment": {"level": "HIGH", "factors": ["High-risk words detected"]},
+        "lexicon_version": "abc123def456",
+        "timestamp": TIMESTAMP,
+    }
+    doc.update(overrides)
+    return doc
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.concern_ids
+
+
+@pytest.fixture
+def registry(collection):
+    return CategoryRegistry(lambda: collection)
+
+
+def test_round_trip_plain(registry):
+    schema = CompactSchema(registry)
+    doc = analysis(user_id="u1", session_id="s1")
+    stored = schema.encode(doc)
+    assert stored["p"] == 0 and stored["r"] == 2 and stored["c"] == [0, 1]
+    assert "x" not in stored
+    assert schema.expand(stored) == doc
+
+
+def test_round_trip_zlib_and_extras(registry):
+    schema = CompactSchema(registry, "zlib")
+    doc = analysis(chunks=[{"start": 0, "end": 5}])
+    doc["intensity_analysis"]["mean_score"] = 5.5
+    stored = schema.encode(doc)
+    assert isinstance(stored["tz"], bytes) and "t" not in stored
+    assert schema.expand(stored) == doc
+
+
+def test_hash_mode_keeps_only_a_digest(registry):
+    stored = CompactSchema(registry, "hash").encode(analysis())
+    expanded = CompactSchema(registry, "hash").expand(stored)
+    assert expanded["input_text"] is None
+    assert len(expanded["input_text_sha256"]) == 64
+
+
+def test_empty_keywords_and_factors_round_trip(registry):
+    schema = CompactSchema(registry)
+    doc = analysis(
+        detected_keywords={"entities": [], "emotions": [], "symptoms": [], "actions": []},
+        risk_assessment={"level": "LOW", "factors": []},
+    )
+    stored = schema.encode(doc)
+    assert "k" not in stored and "rf" not in stored
+    assert schema.expand(stored) == doc
+
+
+def test_summary_projection_expands_to_the_summary_shape(registry):
+    schema = CompactSchema(registry)
+    stored = schema.encode(analysis())
+    projection = schema.projection({
+        "timestamp": 1, "polarity": 1, "identified_concerns": 1,
+        "risk_assessment.level": 1, "intensity_analysis.final_score": 1,
+    })
+    assert projection == {"v": 1, "ts": 1, "p": 1, "c": 1, "r": 1, "s": 1}
+    projected = {key: value for key, value in stored.items() if key in projection}
+    assert schema.expand(projected) == {
+        "polarity": "NEGATIVE",
+        "identified_concerns": ["Depression", "Insomnia"],
+        "intensity_analysis": {"final_score": 8.0},
+        "risk_assessment": {"level": "HIGH"},
+        "timestamp": TIMESTAMP,
+    }
+
+
+def test_field_mapping(registry):
+    schema = CompactSchema(registry)
+    assert schema.field("_id") == "_id"
+    assert schema.field("timestamp") == "ts"
+    assert schema.field("risk_assessment.level") == "r"
+    assert schema.field("intensity_analysis.final_score") == "s"
+    assert schema.field("chunks") == "x.chunks"
+    assert FULL_SCHEMA.field("risk_assessment.level") == "risk_assessment.level"
+
+
+def test_full_schema_documents_pass_through_compact_expand(registry):
+    doc = analysis()
+    assert CompactSchema(registry).expand(doc) is doc
+
+
+def test_registry_ids_are_shared_and_stable(collection):
+    first = CategoryRegistry(lambda: collection)
+    assert first.ids_for(["Anxiety", "Stress", "Anxiety"]) == [0, 1, 0]
+    # Another process sees the same ids
+    second = CategoryRegistry(lambda: collection)
+    assert second.id_for("Stress") == 1
+    assert second.id_for("Grief") == 2
+    assert first.name_for(2) == "Grief"
+
+
+def test_query_values_never_register_categories(collection):
+    registry = CategoryRegistry(lambda: collection)
+    schema = CompactSchema(registry)
+    registry.id_for("Anxiety")
+    assert schema.concern_values(["Anxiety", "Unknown"]) == [0]
+    assert registry.find_id("Unknown") is None
+    assert collection.count_documents({"_id": "Unknown"}) == 0
@@ -0,0 +1,136 @@
+import random
+from datetime import datetime, timedelta
+
+import pymongo
+import pytest
+from bson import ObjectId
+
+from compact_schema import FULL_SCHEMA, CategoryRegistry, CompactSchema
+from history import (
+    InvalidCursor, decode_cursor, encode_cursor, ensure_history_indexes, fetch_history_page, project_document,
+)
+
+mongomock = pytest.importorskip("mongomock")
+
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+LEVELS = ["LOW", "HIGH"]
+
+
+def analysis(i, timestamp):
+    return {
+        "_id": ObjectId(),
+        "input_text": f"text {i}",
+        "polarity": "NEGATIVE",
+        "detected_keywords": {"entities": [], "emotions": [], "symptoms": [], "actions": []},
+        "identified_concerns": ["Anxiety"] if i % 3 else ["Depression", "Anxiety"],
+        "intensity_analysis": {
+            "base_severity": 1, "modifiers": 0, "concern_count": 0.33,
+            "sentiment_impact": 1.2, "repetition_impact": 0, "final_score": float(i % 10),
+        },
+        "risk_assessment": {"level": LEVELS[i % 2], "factors": []},
+        "timestamp": timestamp,
+    }
+
+
+@pytest.fixture(params=["full", "compact"])
+def store(request):
+    db = mongomock.MongoClient().db
+    if request.param == "full":
+        schema = FULL_SCHEMA
+    else:
+        schema = CompactSchema(CategoryRegistry(lambda: db.concern_ids))
+    # Batches land within the same millisecond, so most timestamps tie
+    docs = [analysis(i, BASE + timedelta(milliseconds=i // 7)) for i in range(40)]
+    shuffled = docs[:]
+    random.Random(3).shuffle(shuffled)
+    db.analyses.insert_many([schema.encode(dict(doc)) for doc in shuffled])
+    ensure_history_indexes(db.analyses, schema)
+    return db.analyses, schema, docs
+
+
+def page_through(collection, schema, limit, **filters):
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = fetch_history_page(collection, limit, cursor, schema=schema, **filters)
+        seen.extend(items)
+        if cursor is None:
+            return seen
+
+
+def newest_first(docs):
+    return sorted(docs, key=lambda doc: (doc["timestamp"], doc["_id"]), reverse=True)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 50])
+def test_pages_through_tied_timestamps_exactly_once(store, limit):
+    collection, schema, docs = store
+    seen = page_through(collection, schema, limit)
+    assert [item["id"] for item in seen] == [str(doc["_id"]) for doc in newest_first(docs)]
+
+
+def test_filters_page_in_order(store):
+    collection, schema, docs = store
+    seen = page_through(collection, schema, 4, risk_level="HIGH", concerns=["Depression", "Unknown"])
+    expected = [doc for doc in newest_first(docs)
+                if doc["risk_assessment"]["level"] == "HIGH" and "Depression" in doc["identified_concerns"]]
+    assert [item["id"] for item in seen] == [str(doc["_id"]) for doc in expected]
+
+
+def test_views_expand_to_the_api_shape(store):
+    collection, schema, docs = store
+    latest = newest_first(docs)[0]
+    [summary], _ = fetch_history_page(collection, 1, schema=schema)
+    assert summary == {
+        "id": str(latest["_id"]),
+        "polarity": "NEGATIVE",
+        "identified_concerns": latest["identified_concerns"],
+        "intensity_analysis": {"final_score": latest["intensity_analysis"]["final_score"]},
+        "risk_assessment": {"level": latest["risk_assessment"]["level"]},
+        "timestamp": latest["timestamp"],
+    }
+    [full], _ = fetch_history_page(collection, 1, view="full", schema=schema)
+    expected = dict(latest, id=str(latest["_id"]))
+    del expected["_id"]
+    assert full == expected
+
+
+def test_indexes_use_stored_fields(store):
+    collection, schema, _ = store
+    keys = [[field for field, _ in index["key"]] for index in collection.index_information().values()]
+    assert [schema.field("timestamp"), "_id"] in keys
+    assert all(key[-1] == "_id" for key in keys)
+
+
+class ConflictingCollection:
+    def __init__(self):
+        self.created = []
+        self.dropped = []
+
+    def create_index(self, keys, name):
+        if name not in self.dropped:
+            raise pymongo.errors.OperationFailure("IndexKeySpecsConflict", code=86)
+        self.created.append((keys, name))
+
+    def drop_index(self, name):
+        self.dropped.append(name)
+
+
+def test_outdated_indexes_are_replaced():
+    collection = ConflictingCollection()
+    ensure_history_indexes(collection, CompactSchema(None))
+    assert collection.dropped == ["history_timestamp_compact", "history_risk_level_compact", "history_concerns_compact"]
+    assert collection.created[0] == ([("ts", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], "history_timestamp_compact")
+
+
+def test_cursor_round_trip():
+    doc = {"timestamp": BASE, "_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc)) == (BASE, doc["_id"])
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_project_document():
+    doc = {"a": 1, "b": {"c": 2, "d": 3}, "e": None}
+    assert project_document(doc, {"a": 1, "b.c": 1, "missing.x": 1, "e.f": 1}) == {"a": 1, "b": {"c": 2}}
+    assert project_document(doc, None) is doc
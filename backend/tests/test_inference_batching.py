@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+import pytest
+
+from inference_batching import MicroBatcher
+
+
+def test_coalesces_up_to_max_batch_size():
+    entered = threading.Event()
+    gate = threading.Event()
+    batches = []
+
+    def batch_fn(items):
+        entered.set()
+        gate.wait(5.0)
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=50)
+    # The first call holds the worker so the rest pile up behind it
+    first = batcher.submit(0)
+    assert entered.wait(5.0)
+    futures = [batcher.submit(n) for n in range(1, 8)]
+    gate.set()
+    assert first.result(5.0) == 0
+    assert [future.result(5.0) for future in futures] == [n * 2 for n in range(1, 8)]
+    assert [len(batch) for batch in batches] == [1, 3, 3, 1]
+    assert batcher.stats()["items"] == 8
+
+
+def test_flushes_a_partial_batch_after_max_wait():
+    batcher = MicroBatcher(lambda items: [item + 1 for item in items], max_batch_size=16, max_wait_ms=20)
+    started = time.monotonic()
+    assert batcher(1) == 2
+    assert time.monotonic() - started < 1.0
+    stats = batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["batch_size_histogram"] == {1: 1}
+
+
+def test_batch_fn_errors_reach_every_caller():
+    def batch_fn(items):
+        raise ValueError("model failed")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=20)
+    futures = [batcher.submit(n) for n in range(4)]
+    for future in futures:
+        with pytest.raises(ValueError, match="model failed"):
+            future.result(5.0)
+    assert batcher.stats()["errors"] >= 1
+
+
+def test_short_result_list_fails_the_batch_instead_of_hanging():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=4, max_wait_ms=20)
+    futures = [batcher.submit(n) for n in range(4)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="returned"):
+            future.result(5.0)
+    assert batcher.stats()["errors"] >= 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_restarts_its_worker_after_fork():
+    batcher = MicroBatcher(lambda items: [os.getpid() for _ in items], max_wait_ms=0)
+    assert batcher(None) == os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        # The parent's worker thread does not exist here
+        try:
+            ok = batcher(None) == os.getpid() and batcher._thread.is_alive()
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert batcher(None) == os.getpid()
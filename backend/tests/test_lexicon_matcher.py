@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import lexicon_matcher
+from lexicon_matcher import LexiconMatcher, group_hits
+
+
+@pytest.fixture(params=["python", "pyahocorasick"])
+def backend(request, monkeypatch):
+    # Run every test against the pure-Python automaton, and against
+    # pyahocorasick when it is installed
+    if request.param == "python":
+        monkeypatch.setattr(lexicon_matcher, "ahocorasick", None)
+    elif lexicon_matcher.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    return request.param
+
+
+def naive_find(phrases, text, word_boundary=False):
+    matcher = LexiconMatcher(word_boundary)
+    found = set()
+    for phrase in phrases:
+        start = text.find(phrase)
+        while start != -1:
+            end = start + len(phrase)
+            if not word_boundary or matcher._on_boundary(text, start, end):
+                found.add((phrase, start, end))
+            start = text.find(phrase, start + 1)
+    return found
+
+
+def test_reports_overlapping_hits(backend):
+    matcher = LexiconMatcher().add("words", "w", ["he", "she", "his", "hers"])
+    hits = {(hit.phrase, hit.start, hit.end) for hit in matcher.find("ushers")}
+    assert hits == {("she", 1, 4), ("he", 2, 4), ("hers", 2, 6)}
+
+
+def test_phrases_are_lowercased_and_deduplicated(backend):
+    matcher = LexiconMatcher()
+    matcher.add("concerns", "Anxiety", ["Panic", "panic", ""])
+    matcher.add("concerns", "Stress", ["panic"])
+    hits = matcher.find("panic")
+    assert [(hit.label, hit.start, hit.end) for hit in hits] == [("Anxiety", 0, 5), ("Stress", 0, 5)]
+
+
+def test_weighted_phrases_are_their_own_labels(backend):
+    matcher = LexiconMatcher().add_weighted("severity", {"very": 2, "extremely": 3})
+    assert group_hits(matcher.find("very very extremely tired")) == {"severity": {"very": 2, "extremely": 3}}
+
+
+def test_word_boundary_rejects_partial_words(backend):
+    matcher = LexiconMatcher(word_boundary=True).add("actions", "a", ["kill", "cut"])
+    assert [hit.phrase for hit in matcher.find("skills cutting kill")] == ["kill"]
+    assert [hit.phrase for hit in matcher.find("kill_switch cut.")] == ["cut"]
+
+
+def test_word_boundary_allows_phrases_with_punctuation_edges(backend):
+    # A boundary is only required where both sides are word characters
+    matcher = LexiconMatcher(word_boundary=True).add("symptoms", "s", ["can't sleep", "-ish"])
+    assert [hit.phrase for hit in matcher.find("i can't sleep, tired-ish")] == ["can't sleep", "-ish"]
+
+
+def test_without_word_boundary_substrings_match(backend):
+    matcher = LexiconMatcher().add("actions", "a", ["kill"])
+    assert [hit.start for hit in matcher.find("skills")] == [1]
+
+
+def test_empty_matcher_and_text(backend):
+    assert LexiconMatcher().find("anything") == []
+    assert LexiconMatcher().add("x", "x", ["a"]).find("") == []
+
+
+def test_recompiles_after_add(backend):
+    matcher = LexiconMatcher().add("x", "x", ["sad"])
+    assert len(matcher.find("sad")) == 1
+    matcher.add("x", "y", ["sa"])
+    assert {hit.phrase for hit in matcher.find("sad")} == {"sad", "sa"}
+
+
+@pytest.mark.parametrize("word_boundary", [False, True])
+def test_matches_naive_search(backend, word_boundary):
+    rng = random.Random(7)
+    alphabet = "ab c"
+    for _ in range(200):
+        phrases = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))).strip() or "a" for _ in range(6)}
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        matcher = LexiconMatcher(word_boundary).add("x", "x", phrases)
+        found = {(hit.phrase, hit.start, hit.end) for hit in matcher.find(text)}
+        assert found == naive_find(phrases, text, word_boundary), (phrases, text)
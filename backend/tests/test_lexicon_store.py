@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from lexicon_store import (
+    ACTION, DEFAULT_SOURCE, HAS_MODIFIER, HAS_SEVERITY, HIGH_RISK, LexiconArtifact, LexiconError,
+    compile_lexicons, lexicon_version, load_source, open_artifact,
+)
+
+
+def write_source(path, **overrides):
+    source = {
+        "concern_categories": {"Anxiety": ["Panic", "worried", "panic"], "Depression": ["sad", "worried"]},
+        "severity_words": {"kill": 9, "sad": 4},
+        "intensity_modifiers": {"very": 2, "slightly": -1},
+        "high_risk_words": ["kill"],
+        "emotion_patterns": ["feel"],
+        "symptom_patterns": ["can't sleep"],
+        "action_patterns": ["kill", "cut"],
+    }
+    source.update(overrides)
+    path.write_text(json.dumps(source), encoding="utf-8")
+    return str(path)
+
+
+def test_load_source_lowercases_and_drops_duplicates(tmp_path):
+    lexicons, duplicates = load_source(write_source(tmp_path / "lexicons.json"))
+    assert lexicons["concern_categories"]["Anxiety"] == ["panic", "worried"]
+    assert duplicates == ["Anxiety: 'panic'"]
+
+
+def test_rejects_weights_outside_16_bits(tmp_path):
+    with pytest.raises(LexiconError):
+        load_source(write_source(tmp_path / "lexicons.json", severity_words={"kill": 40000}))
+
+
+def test_artifact_round_trip(tmp_path):
+    lexicons, _ = load_source(write_source(tmp_path / "lexicons.json"))
+    artifact = LexiconArtifact(compile_lexicons(lexicons, str(tmp_path / "lexicons.bin")))
+    assert artifact.to_lexicons() == lexicons
+    assert artifact.version == lexicon_version(lexicons)
+    assert artifact.categories == ["Anxiety", "Depression"]
+    # Shared phrases are stored once
+    assert len(artifact.phrases) == len(set(artifact.phrases))
+
+    severity, modifier, flags = artifact.weights(artifact.phrase_ids["kill"])
+    assert (severity, modifier) == (9, 0)
+    assert flags == HAS_SEVERITY | HIGH_RISK | ACTION
+    assert artifact.weights(artifact.phrase_ids["slightly"]) == (0, -1, HAS_MODIFIER)
+    assert artifact.categories_for({"worried"}) == ["Anxiety", "Depression"]
+    assert artifact.categories_for({"sad", "unknown"}) == ["Depression"]
+
+
+def test_bitsets_span_more_than_64_categories(tmp_path):
+    categories = {f"C{i}": [f"p{i}", "shared"] for i in range(70)}
+    lexicons, _ = load_source(write_source(tmp_path / "lexicons.json", concern_categories=categories))
+    artifact = LexiconArtifact(compile_lexicons(lexicons, str(tmp_path / "lexicons.bin")))
+    assert artifact.categories_for({"p69"}) == ["C69"]
+    assert artifact.categories_for({"shared"}) == list(categories)
+    assert artifact.to_lexicons() == lexicons
+
+
+def test_version_changes_with_content(tmp_path):
+    first, _ = load_source(write_source(tmp_path / "a.json"))
+    second, _ = load_source(write_source(tmp_path / "b.json", emotion_patterns=["feel", "felt"]))
+    assert lexicon_version(first) != lexicon_version(second)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "lexicons.bin"
+    path.write_bytes(b"not an artifact" * 10)
+    with pytest.raises(LexiconError):
+        LexiconArtifact(str(path))
+    path.write_bytes(b"MH")
+    with pytest.raises(LexiconError):
+        LexiconArtifact(str(path))
+
+
+def test_open_artifact_rebuilds_when_source_is_newer(tmp_path):
+    source = write_source(tmp_path / "lexicons.json")
+    artifact_path = str(tmp_path / "lexicons.bin")
+    first = open_artifact(artifact_path, source)
+    write_source(tmp_path / "lexicons.json", emotion_patterns=["feel", "felt"])
+    later = os.path.getmtime(artifact_path) + 10
+    os.utime(source, (later, later))
+    second = open_artifact(artifact_path, source)
+    assert second.version != first.version
+    assert second.to_lexicons()["emotion_patterns"] == ["feel", "felt"]
+
+
+def test_shipped_lexicons_compile_cleanly(tmp_path):
+    lexicons, duplicates = load_source(DEFAULT_SOURCE)
+    assert duplicates == []
+    artifact = LexiconArtifact(compile_lexicons(lexicons, str(tmp_path / "lexicons.bin")))
+    assert artifact.to_lexicons() == lexicons
@@ -0,0 +1,62 @@
+import os
+import signal
+
+import pytest
+
+from process_engine import ProcessEngine, slice_cores
+
+
+def test_slices_are_disjoint_and_cover_the_cores():
+    cores = list(range(8))
+    slices = [slice_cores(cores, slot, 4) for slot in range(4)]
+    assert slices == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    uneven = [slice_cores(list(range(7)), slot, 3) for slot in range(3)]
+    assert uneven == [[0, 1, 2], [3, 4], [5, 6]]
+
+
+def test_more_slots_than_cores_share_round_robin():
+    assert [slice_cores([0, 1], slot, 3) for slot in range(3)] == [[0], [1], [0]]
+    assert slice_cores([0, 1, 2], 0, 1) == [0, 1, 2]
+
+
+def _pid():
+    return os.getpid()
+
+
+def _die():
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _double(items, factor):
+    return [item * factor for item in items]
+
+
+needs_fork = pytest.mark.skipif(not hasattr(os, "fork"), reason="the engine forks its workers")
+
+
+@needs_fork
+def test_recovers_from_a_dead_worker():
+    engine = ProcessEngine(1, pin_cores=False)
+    try:
+        first = engine.run(_pid)
+        os.kill(first, signal.SIGKILL)
+        # The pool is broken now; the call is retried on a fresh one
+        assert engine.run(_pid) != first
+        assert engine.map_shards(_double, [1, 2, 3], 2) == [2, 4, 6]
+        assert engine.stats()["restarts"] == 1
+    finally:
+        engine.shutdown()
+
+
+@needs_fork
+def test_task_that_kills_its_worker_fails_once_then_the_pool_works():
+    from concurrent.futures.process import BrokenProcessPool
+    engine = ProcessEngine(1, pin_cores=False)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            engine.run(_die)
+        assert engine.run(_pid) != os.getpid()
+        stats = engine.stats()
+        assert (stats["restarts"], stats["errors"]) == (2, 1)
+    finally:
+        engine.shutdown()
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from profiles import InvalidSubject, escalation_status, profile_update, profile_updates, subject_fields
+
+mongomock = pytest.importorskip("mongomock")
+
+BASE = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def analysis(minutes, score, level, concerns=(), **subject):
+    return {
+        "timestamp": BASE + timedelta(minutes=minutes),
+        "intensity_analysis": {"final_score": score},
+        "risk_assessment": {"level": level},
+        "identified_concerns": list(concerns),
+        **subject,
+    }
+
+
+def apply(profiles, updates):
+    # Same effect as record_profiles' ordered bulk_write
+    for update in updates:
+        profiles.update_one(update._filter, update._doc, upsert=update._upsert)
+
+
+@pytest.fixture
+def profiles():
+    return mongomock.MongoClient().db.risk_profiles
+
+
+def test_update_is_a_single_upserted_pipeline_stage():
+    update = profile_update(analysis(0, 4.0, "HIGH", ["Anxiety"], user_id="u1", session_id="s1"), 0.3, 5)
+    assert update._filter == {"_id": "user:u1"}
+    assert update._upsert
+    [stage] = update._doc
+    fields = stage["$set"]
+    assert sorted(fields) == [
+        "concerns.Anxiety", "count", "ewma_intensity", "first_seen", "last_intensity", "last_seen",
+        "recent_risk_levels", "risk_levels.HIGH",
+    ]
+    assert fields["recent_risk_levels"]["$slice"][1] == -5
+    assert fields["last_intensity"] == 4.0
+
+
+def test_first_analysis_seeds_the_average_and_later_ones_blend_in(profiles):
+    apply(profiles, [profile_update(analysis(0, 4.0, "LOW", user_id="u1"), 0.25, 5)])
+    assert profiles.find_one({"_id": "user:u1"})["ewma_intensity"] == 4.0
+    apply(profiles, [profile_update(analysis(1, 8.0, "LOW", user_id="u1"), 0.25, 5)])
+    profile = profiles.find_one({"_id": "user:u1"})
+    assert profile["ewma_intensity"] == pytest.approx(0.25 * 8.0 + 0.75 * 4.0)
+    assert profile["last_intensity"] == 8.0
+    assert profile["count"] == 2
+
+
+def test_risk_window_keeps_only_the_latest_levels(profiles):
+    levels = ["LOW", "HIGH", "MEDIUM", "HIGH", "LOW"]
+    apply(profiles, [profile_update(analysis(i, 1.0, level, session_id="s1"), 0.5, 3) for i, level in enumerate(levels)])
+    profile = profiles.find_one({"_id": "session:s1"})
+    assert profile["recent_risk_levels"] == ["MEDIUM", "HIGH", "LOW"]
+    assert profile["risk_levels"] == {"LOW": 2, "HIGH": 2, "MEDIUM": 1}
+    assert profile["first_seen"] == BASE
+    assert profile["last_seen"] == BASE + timedelta(minutes=4)
+
+
+def test_concern_counters_accumulate_per_category(profiles):
+    apply(profiles, [
+        profile_update(analysis(0, 2.0, "LOW", ["Anxiety"], user_id="u1"), 0.5, 5),
+        profile_update(analysis(1, 2.0, "LOW", ["Anxiety", "Depression"], user_id="u1"), 0.5, 5),
+    ])
+    assert profiles.find_one({"_id": "user:u1"})["concerns"] == {"Anxiety": 2, "Depression": 1}
+
+
+def test_profile_updates_apply_oldest_first_and_skip_anonymous(profiles):
+    batch = [
+        analysis(2, 9.0, "HIGH", user_id="u1"),
+        analysis(0, 1.0, "LOW", user_id="u1"),
+        analysis(1, 5.0, "LOW"),
+        analysis(1, 3.0, "MEDIUM", user_id="u1"),
+    ]
+    updates = profile_updates(batch, 0.5, 5)
+    assert [update._doc[0]["$set"]["last_intensity"] for update in updates] == [1.0, 3.0, 9.0]
+    apply(profiles, updates)
+    profile = profiles.find_one({"_id": "user:u1"})
+    assert profile["recent_risk_levels"] == ["LOW", "MEDIUM", "HIGH"]
+    assert profile["ewma_intensity"] == pytest.approx(0.5 * 9.0 + 0.5 * (0.5 * 3.0 + 0.5 * 1.0))
+    assert profiles.count_documents({}) == 1
+
+
+def test_escalation_thresholds():
+    profile = {"recent_risk_levels": ["HIGH", "LOW", "HIGH"], "ewma_intensity": 6.789, "count": 3}
+    status = escalation_status(profile, high_risk_threshold=2, ewma_threshold=7.0)
+    assert status["escalating"]
+    assert status["reasons"] == ["2 HIGH risk assessments in the last 3"]
+    assert status["high_risk_recent"] == 2
+    assert status["ewma_intensity"] == 6.79
+
+    status = escalation_status(profile, high_risk_threshold=3, ewma_threshold=6.5)
+    assert status["reasons"] == ["Weighted intensity 6.8 at or above 6.5"]
+
+    assert not escalation_status(profile, high_risk_threshold=3, ewma_threshold=7.0)["escalating"]
+    empty = escalation_status({}, high_risk_threshold=1, ewma_threshold=1.0)
+    assert not empty["escalating"]
+    assert empty["count"] == 0
+
+
+def test_subject_fields_validation():
+    assert subject_fields({"user_id": "u1", "session_id": ""}) == {"user_id": "u1"}
+    with pytest.raises(InvalidSubject):
+        subject_fields({"user_id": 42})
+    with pytest.raises(InvalidSubject):
+        subject_fields({"session_id": "x" * 129})
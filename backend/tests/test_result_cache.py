@@ -0,0 +1,62 @@
+import pymongo
+import pytest
+
+from result_cache import ResultCache, cache_key
+
+
+def test_cache_key_is_exact_text():
+    # Normalizing would let "ｋｉｌｌ" or "can't   sleep" reuse another text's result
+    assert cache_key("kill", "v1") != cache_key("ｋｉｌｌ", "v1")
+    assert cache_key("I can't sleep", "v1") != cache_key("I can't   sleep", "v1")
+    assert cache_key(" sad", "v1") != cache_key("sad", "v1")
+    assert cache_key("sad", "v1") == cache_key("sad", "v1")
+    assert cache_key("sad", "v1") != cache_key("sad", "v2")
+
+
+def test_memory_tier_is_lru_and_copies():
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", {"x": [1]})
+    cache.put("b", {"x": [2]})
+    cache.get("a")["x"].append(99)
+    cache.put("c", {"x": [3]})
+    assert cache.get("a") == {"x": [1]}
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+class ConflictingCollection:
+    # A cache collection whose TTL index was built with another expiry
+    name = "analysis_cache"
+
+    def __init__(self, coll_mod_error=None):
+        self.database = self
+        self.coll_mod_error = coll_mod_error
+        self.commands = []
+        self.docs = {}
+
+    def create_index(self, key, expireAfterSeconds):
+        raise pymongo.errors.OperationFailure("IndexOptionsConflict", code=85)
+
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+        if self.coll_mod_error:
+            raise pymongo.errors.OperationFailure(self.coll_mod_error, code=13)
+
+    def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    def replace_one(self, query, doc, upsert):
+        self.docs[query["_id"]] = doc
+
+
+@pytest.mark.parametrize("coll_mod_error", [None, "Unauthorized"])
+def test_changed_ttl_keeps_persistent_tier(coll_mod_error):
+    collection = ConflictingCollection(coll_mod_error)
+    cache = ResultCache(max_entries=0, ttl_seconds=120, get_collection=lambda: collection)
+    cache.put("a", {"x": 1})
+    assert cache.get("a") == {"x": 1}
+    assert cache.stats()["persistent_errors"] == 0
+    assert collection.commands == [(("collMod", "analysis_cache"), {
+        "index": {"keyPattern": {"created_at": 1}, "expireAfterSeconds": 120}
+    })]
@@ -0,0 +1,23 @@
+import pytest
+
+# scoring_parity imports app through benchmark; the models are replaced by
+# the benchmark's offline stubs (spacy.blank, or a regex tokenizer)
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+import benchmark
+from scoring_parity import EDGE_CASES, check
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stub_models():
+    benchmark.install_stubs()
+
+
+def test_edge_cases_match_the_legacy_scorer():
+    assert check(EDGE_CASES) == []
+
+
+def test_benchmark_corpus_matches_the_legacy_scorer():
+    texts = [text for texts in benchmark.build_corpus(100, 1234).values() for text in texts]
+    assert check(texts) == []
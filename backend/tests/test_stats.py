@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from stats import rollup_stats, rollup_updates
+
+mongomock = pytest.importorskip("mongomock")
+
+BASE = datetime(2024, 5, 1, 10, 15, 0)
+
+
+def analysis(timestamp, score, concerns, level):
+    return {
+        "timestamp": timestamp,
+        "identified_concerns": concerns,
+        "intensity_analysis": {"final_score": score},
+        "risk_assessment": {"level": level},
+    }
+
+
+ANALYSES = [
+    analysis(BASE, 2.5, ["Anxiety"], "LOW"),
+    analysis(BASE + timedelta(minutes=30), 4.0, ["Anxiety", "Depression"], "HIGH"),
+    analysis(BASE + timedelta(hours=1), 1.5, [], "LOW"),
+    analysis(BASE + timedelta(days=1), 3.0, ["Depression"], "MEDIUM"),
+]
+
+
+def apply(rollups, updates):
+    # Same effect as bulk_write(updates), which mongomock does not take from
+    # every pymongo version
+    for update in updates:
+        rollups.update_one(update._filter, update._doc, upsert=update._upsert)
+
+
+def test_rollup_updates_collapse_each_hour_into_one_increment():
+    updates = rollup_updates(ANALYSES[:3])
+    by_key = {update._filter["_id"]: update._doc for update in updates}
+    assert sorted(by_key) == ["2024-05-01T10", "2024-05-01T11"]
+    first = by_key["2024-05-01T10"]
+    assert first["$inc"] == {
+        "count": 2, "score_sum": 6.5, "concerns.Anxiety": 2, "concerns.Depression": 1,
+        "risk_levels.LOW": 1, "risk_levels.HIGH": 1,
+    }
+    assert first["$setOnInsert"] == {"bucket": datetime(2024, 5, 1, 10)}
+    assert all(update._upsert for update in updates)
+    assert rollup_updates([]) == []
+
+
+def test_rollups_accumulate_across_batches():
+    rollups = mongomock.MongoClient().db.rollups
+    apply(rollups, rollup_updates(ANALYSES[:1]))
+    apply(rollups, rollup_updates(ANALYSES[1:2]))
+    doc = rollups.find_one({"_id": "2024-05-01T10"})
+    assert doc["count"] == 2
+    assert doc["score_sum"] == 6.5
+    assert doc["concerns"] == {"Anxiety": 2, "Depression": 1}
+
+
+@pytest.fixture
+def rollups():
+    collection = mongomock.MongoClient().db.rollups
+    apply(collection, rollup_updates(ANALYSES))
+    return collection
+
+
+def test_rollup_stats_by_day(rollups):
+    stats = rollup_stats(rollups, bucket="day")
+    assert stats["concern_counts"] == {"Anxiety": 2, "Depression": 2}
+    assert stats["risk_levels"] == {"LOW": 2, "HIGH": 1, "MEDIUM": 1}
+    assert stats["score_trend"] == [
+        {"bucket": "2024-05-01T00:00:00", "avg_final_score": 2.67, "count": 3},
+        {"bucket": "2024-05-02T00:00:00", "avg_final_score": 3.0, "count": 1},
+    ]
+
+
+def test_rollup_stats_by_hour_within_a_range(rollups):
+    stats = rollup_stats(rollups, bucket="hour", since=BASE, until=BASE + timedelta(hours=2))
+    assert stats["score_trend"] == [
+        {"bucket": "2024-05-01T10:00:00", "avg_final_score": 3.25, "count": 2},
+        {"bucket": "2024-05-01T11:00:00", "avg_final_score": 1.5, "count": 1},
+    ]
+    assert stats["risk_levels"] == {"LOW": 2, "HIGH": 1}
+    assert rollup_stats(rollups, since=BASE + timedelta(days=3)) == {
+        "concern_counts": {}, "risk_levels": {}, "score_trend": [],
+    }
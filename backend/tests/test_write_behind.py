@@ -0,0 +1,94 @@
+import threading
+import time
+
+import bson.errors
+
+from write_behind import WriteBehindWriter
+
+
+class RecordingCollection:
+    def __init__(self, block=None):
+        self.block = block
+        self.entered = threading.Event()
+        self.inserted = []
+
+    def insert_many(self, docs, ordered):
+        self.entered.set()
+        if self.block is not None:
+            self.block.wait()
+        self.inserted.extend(docs)
+
+
+def test_writes_transformed_docs_and_hands_originals_to_after_write():
+    collection = RecordingCollection()
+    written = []
+    writer = WriteBehindWriter(lambda: collection, flush_interval_ms=0, after_write=written.extend,
+                               transform=lambda doc: {"v": doc["value"]})
+    assert writer.submit({"value": 1})
+    writer.flush()
+    assert collection.inserted == [{"v": 1}]
+    assert written == [{"value": 1}]
+    writer.close()
+
+
+def test_close_is_bounded_when_mongo_is_stuck():
+    block = threading.Event()
+    collection = RecordingCollection(block)
+    writer = WriteBehindWriter(lambda: collection, max_batch=1, flush_interval_ms=0,
+                               max_pending=2, enqueue_timeout=0.01)
+    assert writer.submit({"n": 0})
+    assert collection.entered.wait(1.0)
+    submitted = 1 + sum(writer.submit({"n": n}) for n in range(1, 5))
+    started = time.monotonic()
+    writer.close(timeout=0.2)
+    assert time.monotonic() - started < 1.0
+    stats = writer.stats()
+    # One document is stuck in insert_many, the buffer is full behind it
+    assert submitted == 3
+    assert stats["dropped"] == 2
+    assert not writer.submit({"n": 6})
+    block.set()
+
+
+class FailingCollection(RecordingCollection):
+    def insert_many(self, docs, ordered):
+        if any(doc.get("bad") for doc in docs):
+            raise bson.errors.InvalidDocument("cannot encode object")
+        super().insert_many(docs, ordered)
+
+
+def test_non_mongo_errors_fail_the_batch_without_killing_the_writer():
+    collection = FailingCollection()
+
+    def transform(doc):
+        if doc.get("explode"):
+            raise TypeError("not serializable")
+        return doc
+
+    writer = WriteBehindWriter(lambda: collection, max_batch=1, flush_interval_ms=0, transform=transform)
+    assert writer.submit({"bad": True})
+    assert writer.submit({"explode": True})
+    writer.flush()
+    assert writer.submit({"n": 1})
+    writer.flush()
+    assert collection.inserted == [{"n": 1}]
+    stats = writer.stats()
+    assert stats["failed"] == 2
+    assert stats["written"] == 1
+    writer.close()
+
+
+def test_restarts_a_dead_writer_thread_without_losing_the_buffer():
+    collection = RecordingCollection()
+    writer = WriteBehindWriter(lambda: collection, flush_interval_ms=0)
+    assert writer.submit({"n": 0})
+    writer.flush()
+    # Stop the thread behind the writer's back, then leave a document queued
+    writer._queue.put(None)
+    writer._thread.join(1.0)
+    assert not writer._thread.is_alive()
+    writer._queue.put({"n": 1})
+    assert writer.submit({"n": 2})
+    writer.flush()
+    assert collection.inserted == [{"n": 0}, {"n": 1}, {"n": 2}]
+    writer.close()
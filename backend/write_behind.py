@@ -0,0 +1,171 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    # Buffers documents in a bounded queue and writes them from a background
+    # thread with insert_many(ordered=False), flushing when max_batch
+    # documents are waiting or flush_interval_ms has elapsed. submit() blocks
+    # for at most enqueue_timeout seconds when the buffer is full and returns
+    # False if the document could not be buffered. get_collection is called
+    # on every flush so the writer never holds a connection across fork.
+    # after_write, if set, receives the documents that were written;
+    # transform, if set, maps each document to the form that is stored.
+    def __init__(self, get_collection, max_batch=500, flush_interval_ms=200, max_pending=10000, enqueue_timeout=1.0, after_write=None, transform=None):
+        self.get_collection = get_collection
+        self.after_write = after_write
+        self.transform = transform
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_pending = max(1, int(max_pending))
+        self.enqueue_timeout = enqueue_timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._closed = False
+        self._counters = {
+            "submitted": 0,
+            "written": 0,
+            "rejected": 0,
+            "failed": 0,
+            "dropped": 0,
+            "flushes": 0,
+        }
+        atexit.register(self.close)
+
+    def submit(self, doc):
+        if self._closed:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put(doc, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self._counters["rejected"] += 1
+            return False
+        with self._lock:
+            self._counters["submitted"] += 1
+        return True
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each process starts its own writer;
+        # a writer thread that died is restarted on the same buffer
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                if self._thread.is_alive():
+                    return
+                logger.warning("write-behind: writer thread died, restarting it")
+            else:
+                self._queue = queue.Queue(maxsize=self.max_pending)
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    doc = self._queue.get(timeout=remaining)
+                else:
+                    doc = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if doc is None:
+                # Shutdown sentinel: write what we have and stop
+                return batch, True
+            batch.append(doc)
+        return batch, False
+
+    def _write(self, batch):
+        try:
+            stored = [self.transform(doc) for doc in batch] if self.transform is not None else batch
+            self.get_collection().insert_many(stored, ordered=False)
+            written = batch
+        except pymongo.errors.BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            written = [doc for i, doc in enumerate(batch) if i not in failed]
+            logger.warning("write-behind: %d of %d documents failed", len(batch) - len(written), len(batch))
+        except Exception:
+            # Includes InvalidDocument / DocumentTooLarge and transform
+            # errors, which must not take the writer thread down
+            written = []
+            logger.exception("write-behind: dropped batch of %d documents", len(batch))
+        with self._lock:
+            self._counters["written"] += len(written)
+            self._counters["failed"] += len(batch) - len(written)
+            self._counters["flushes"] += 1
+        if written and self.after_write is not None:
+            try:
+                self.after_write(written)
+            except Exception:
+                logger.exception("write-behind: after_write hook failed")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                # Keeps flush() from blocking forever if a write blows up
+                for _ in range(len(batch) + stopping):
+                    self._queue.task_done()
+
+    def flush(self):
+        # Blocks until everything submitted so far has been written
+        if self._pid == os.getpid():
+            if not self._closed:
+                self._ensure_worker()
+            self._queue.join()
+
+    def close(self, timeout=10.0):
+        # Waits at most timeout seconds in all, even with a full buffer and
+        # MongoDB down; whatever is still buffered then is counted as dropped
+        if self._closed:
+            return
+        self._closed = True
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+            sentinel_queued = True
+        except queue.Full:
+            sentinel_queued = False
+        else:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            # The sentinel, if queued, is behind every buffered document
+            dropped = max(0, self._queue.qsize() - sentinel_queued)
+            with self._lock:
+                self._counters["dropped"] += dropped
+            logger.warning("write-behind: closed with %d documents still buffered", dropped)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters.update({
+            "pending": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "max_pending": self.max_pending,
+            "max_batch": self.max_batch,
+            "flush_interval_ms": self.flush_interval * 1000.0,
+        })
+        return counters